@@ -1,124 +1,435 @@
 # Simple buffer pool for Page objects with pin/unpin and dirty tracking.
-# Policy: Toss Immediate eviction (first unpinned frame).
+# Policy: 2Q. A newly loaded page enters A1in, a FIFO of pages touched
+# once. Pinning it again sets its reference bit, and the next eviction
+# scan promotes it to Am. Am is a CLOCK ring: the hand clears reference
+# bits until it finds an unpinned, unreferenced frame. A1in is drained
+# first once it holds more than A1IN_FRACTION of the pool, so a one-pass
+# scan cannot push the working set out.
+#
+# Locking:
+#   - hit path: lock-free dict lookup, then the frame's own lock to pin
+#   - frame lock: pin/unpin and dirty marking, eviction check
+#   - structural lock: anything that inserts or removes frames, the hand
+#   Lock order is always structural -> frame.
 
-import time
+import os
 from collections import OrderedDict
-from lstore.page import Page
-from lstore.storage import read_page_bytes, write_page_bytes, page_path
+from lstore import config
+from lstore.page import Page, PAGE_SIZE
+from lstore.storage import read_page_into, write_page_run, column_path, open_column_file
 import threading
 
 
+# Page key layout (one int):
+#   bits 49..   table_id
+#   bit  48     is_base
+#   bits 32..47 col_id      (< MAX_COLUMNS, checked by Table)
+#   bits 0..31  page_index  (< 2**32)
+PAGE_INDEX_MASK = (1 << 32) - 1
+COL_ID_MASK = 0xFFFF
+MAX_COLUMNS = COL_ID_MASK + 1
+
+
+def make_key(table_id, is_base, col_id, page_index):
+    """
+    Pack a page address into one int (see layout above).
+    """
+    return (table_id << 49) | (is_base << 48) | (col_id << 32) | page_index
+
+
+def _unpack_key(key):
+    """
+    Inverse of make_key(): (table_id, is_base, col_id, page_index).
+    """
+    return (key >> 49, bool((key >> 48) & 1), (key >> 32) & COL_ID_MASK,
+            key & PAGE_INDEX_MASK)
+
+MAX_RUN_PAGES = 1024  # IOV_MAX: buffers per pwritev call
+
+
 class PageFrame:
-    def __init__(self, key, page: Page):
-        self.key = key  # (table_name, is_base, col_id, page_index)
+    # fixed attribute set: smaller frames and faster field access on the
+    # pin/unpin path
+    __slots__ = ("key", "fd", "page", "pin_count", "dirty", "referenced",
+                 "evicted", "slot", "_lock")
+
+    def __init__(self, key, page: Page, fd=None):
+        self.key = key  # int from make_key()
+        self.fd = fd  # open column file holding this page
 
         self.page = page
 
         self.pin_count = 0
 
         self.dirty = False
-        self.last_used_ts = time.time()
+        self.referenced = True
+        self.evicted = False
+        self.slot = -1  # index in BufferPool._ring, -1 while in A1in
+
+        self._lock = threading.Lock()
+
+    def reset(self, key, page: Page, fd=None):
+        """
+        Rebind a recycled frame to a new page. Caller holds self._lock so a
+        stale lock-free lookup sees the new key and backs off.
+        """
+        self.key = key
+        self.fd = fd
+        self.page = page
+        self.pin_count = 0
+        self.dirty = False
+        self.referenced = True
+        self.evicted = False
+        self.slot = -1
 
     def pin(self):
         self.pin_count += 1
-        self.last_used_ts = time.time()
-
-    def unpin(self):
-        if self.pin_count > 0:
-            self.pin_count -= 1
-        self.last_used_ts = time.time()
+        self.referenced = True
 
 
 class BufferPool:
     def __init__(self, max_pages: int):
         self.max_pages = max_pages
 
+        # key -> PageFrame
         self._frames = {}
-        self._lru = OrderedDict()
 
-        self.pool_lock = threading.Lock()
+        # evicted frames kept for reuse by the next miss
+        self._frame_freelist = []
 
-    def _touch_lru(self, key):
-        if key in self._lru:
-            self._lru.move_to_end(key)
-        else:
-            self._lru[key] = True
+        # A1in: key -> PageFrame, oldest first
+        self._a1in = OrderedDict()
+        self._a1in_max = max(1, int(max_pages * config.A1IN_FRACTION))
+
+        # Am CLOCK ring: slot -> PageFrame (None if the slot is free)
+        self._ring = []
+        self._free_slots = []
+        self._clock_hand = 0
 
-    def get_page(self, table_name: str, is_base: bool, col_id: int, page_index: int,
+        self._structural_lock = threading.Lock()
+
+        # table name -> table_id, and table_id -> table name
+        self._table_ids = {}
+        self._table_names = []
+
+        # (key >> 32), i.e. (table_id, is_base, col_id) -> open column file
+        self._fd_cache = {}
+
+        # dirty frame accounting for the background flusher
+        self._dirty_count = 0
+        self._dirty_lock = threading.Lock()
+        self._dirty_ratio_threshold = 0.5
+        self._flush_event = threading.Event()
+        self._closed = False
+
+        self._flusher = threading.Thread(target=self._flusher_loop, daemon=True)
+        self._flusher.start()
+
+    def register_table(self, table_name: str) -> int:
+        """
+        Return the small int id for a table, assigning one on first use.
+        """
+        with self._structural_lock:
+            table_id = self._table_ids.get(table_name)
+            if table_id is None:
+                table_id = len(self._table_names)
+                self._table_names.append(table_name)
+                self._table_ids[table_name] = table_id
+            return table_id
+
+    def get_page(self, table_id: int, is_base: bool, col_id: int, page_index: int,
                  create_if_missing: bool = False):
         """
         Fetch a page into the buffer pool and pin it.
 
-        
+        A hit does an unlocked dict lookup and takes only the frame's lock;
+        a miss takes the structural lock to load the page and possibly evict.
         """
 
-        key = (table_name, bool(is_base), int(col_id), int(page_index))
+        # make_key(), inlined: this is the hottest call in the engine
+        key = (table_id << 49) | (is_base << 48) | (col_id << 32) | page_index
+
+        frame = self._frames.get(key)
+        if frame is not None:
+            with frame._lock:
+                # the frame may have been evicted (and recycled) since the lookup
+                if not frame.evicted and frame.key == key:
+                    frame.pin_count += 1
+                    frame.referenced = True
+                    return frame
 
-        with self.pool_lock:
+        with self._structural_lock:
+            # another thread may have loaded it while we waited
             frame = self._frames.get(key)
             if frame is not None:
-                frame.pin()
-                self._touch_lru(key)
+                with frame._lock:
+                    frame.pin()
                 return frame
 
             if len(self._frames) >= self.max_pages:
                 self._evict_one()
 
             # disk storage
-            path = page_path(table_name, is_base, col_id, page_index)
-            byte_data = read_page_bytes(path)
+            fd = self._fd_for(key)
+            frame = self._frame_freelist.pop() if self._frame_freelist else None
+            # read straight into the recycled frame's page buffer; it was
+            # written back before the frame reached the freelist
+            buffer = frame.page.data if frame is not None else bytearray(PAGE_SIZE)
+            if read_page_into(fd, page_index, buffer) is None:
+                buffer = None
 
-            if byte_data is None:
+            if buffer is None:
                 if not create_if_missing:
+                    if frame is not None:
+                        self._frame_freelist.append(frame)
                     return None
                 page = Page()
             else:
-                page = Page.from_bytes(byte_data)
+                page = Page.from_buffer(buffer)
 
-            frame = PageFrame(key, page)
-            frame.pin()
+            if frame is not None:
+                with frame._lock:
+                    frame.reset(key, page, fd)
+            else:
+                frame = PageFrame(key, page, fd)
+            frame.pin_count = 1
+            frame.referenced = False  # set again only by a second touch
+            self._a1in[key] = frame
             self._frames[key] = frame
-            self._touch_lru(key)
             return frame
 
-    def mark_dirty(self, frame: PageFrame):
-        with self.pool_lock:
-            frame.dirty = True
-            frame.last_used_ts = time.time()
+    def _fd_for(self, key):
+        """
+        Return the cached descriptor of the column file holding key,
+        opening it on first use. Caller holds the structural lock.
+        """
+        column = key >> 32
+        fd = self._fd_cache.get(column)
+        if fd is None:
+            table_id, is_base, col_id, _ = _unpack_key(key)
+            path = column_path(self._table_names[table_id], is_base, col_id)
+            fd = self._fd_cache[column] = open_column_file(path)
+        return fd
+
+    def unpin(self, frame: PageFrame, dirty: bool = False):
+        """
+        Drop one pin. Write paths pass dirty=True to mark the frame dirty
+        under the same frame-lock acquisition. Never touches the
+        structural lock.
+        """
+        with frame._lock:
+            if dirty and not frame.dirty:
+                self._set_dirty(frame)
+            if frame.pin_count > 0:
+                frame.pin_count -= 1
 
-    def unpin(self, frame: PageFrame):
-        with self.pool_lock:
-            frame.unpin()
-            self._touch_lru(frame.key)
+    def _set_dirty(self, frame: PageFrame):
+        # caller holds frame._lock
+        frame.dirty = True
+        with self._dirty_lock:
+            self._dirty_count += 1
+            if self._dirty_count > self._dirty_ratio_threshold * self.max_pages:
+                self._flush_event.set()
 
     def _evict_one(self):
         """
-        Evict one unpinned frame.
+        Evict one unpinned frame. Caller holds the structural lock.
+
+        A1in is searched first while it is over its share of the pool,
+        otherwise Am is. Clean frames are preferred: both queues are
+        searched for a clean victim before a dirty one is taken. In that
+        case up to EVICT_BATCH unpinned dirty frames are written back
+        together so the following evictions find clean victims.
         """
 
-        for key, frame in list(self._frames.items()):
-            if frame.pin_count == 0:
-                self._flush_if_dirty(frame)  
-                del self._frames[key]
-                if key in self._lru:
-                    del self._lru[key]
+        if len(self._a1in) > self._a1in_max:
+            scans = (self._a1in_scan, self._clock_sweep)
+        else:
+            scans = (self._clock_sweep, self._a1in_scan)
+
+        frame = None
+        for allow_dirty in (False, True):
+            for scan in scans:
+                frame = scan(allow_dirty)
+                if frame is not None:
+                    break
+            if frame is not None:
+                break
+        if frame is None:
+            raise RuntimeError("BufferPool is full and all pages are pinned; cannot evict")
+
+        del self._frames[frame.key]
+        if frame.slot < 0:
+            del self._a1in[frame.key]
+        else:
+            self._ring[frame.slot] = None
+            self._free_slots.append(frame.slot)
+
+        if frame.dirty:
+            self.flush_batch(self._unpinned_dirty(config.EVICT_BATCH, [frame]))
+            self._flush_event.set()
+
+        self._frame_freelist.append(frame)
+
+    def _a1in_scan(self, allow_dirty):
+        """
+        Walk A1in oldest first. Frames touched again since they were loaded
+        are promoted to Am; the first other unpinned frame is the victim.
+        Frames that cannot be taken yet are rotated to the back.
+        """
+        a1in = self._a1in
+        for _ in range(len(a1in)):
+            key, frame = next(iter(a1in.items()))
+            with frame._lock:
+                if frame.referenced:
+                    action = "promote"
+                elif frame.pin_count or (frame.dirty and not allow_dirty):
+                    action = "skip"
+                else:
+                    frame.evicted = True
+                    return frame
+
+            if action == "promote":
+                del a1in[key]
+                self._ring_insert(frame)
+            else:
+                a1in.move_to_end(key)
+
+        return None
+
+    def _ring_insert(self, frame):
+        if self._free_slots:
+            frame.slot = self._free_slots.pop()
+            self._ring[frame.slot] = frame
+        else:
+            frame.slot = len(self._ring)
+            self._ring.append(frame)
+
+    def _clock_sweep(self, allow_dirty):
+        """
+        Advance the clock hand, clearing reference bits, until it reaches
+        an unpinned frame whose bit is already clear. The frame is marked
+        evicted; the caller removes it from the pool.
+        """
+        ring = self._ring
+        n = len(ring)
+        for _ in range(2 * n):
+            slot = self._clock_hand
+            self._clock_hand = (slot + 1) % n
+            frame = ring[slot]
+            if frame is None:
+                continue
+
+            with frame._lock:
+                if frame.pin_count or frame.referenced:
+                    frame.referenced = False
+                    continue
+                if frame.dirty and not allow_dirty:
+                    continue
+                frame.evicted = True
+                return frame
+
+        return None
+
+    def _unpinned_dirty(self, limit, batch=None):
+        """
+        Collect up to limit unpinned dirty frames (appending to batch if
+        given): A1in first, then Am starting at the clock hand, so the
+        frames closest to eviction are picked first.
+        """
+        if batch is None:
+            batch = []
+        for frame in self._a1in.values():
+            if len(batch) >= limit:
+                return batch
+            if frame.dirty and frame.pin_count == 0:
+                batch.append(frame)
+
+        ring = self._ring
+        n = len(ring)
+        for i in range(n):
+            if len(batch) >= limit:
+                break
+            frame = ring[(self._clock_hand + i) % n]
+            if frame is not None and frame.dirty and frame.pin_count == 0:
+                batch.append(frame)
+        return batch
+
+    # -----------------------------------------------------------
+    #  BACKGROUND FLUSHER
+    # -----------------------------------------------------------
+    def _flusher_loop(self):
+        """
+        Write back dirty frames out of line once the dirty ratio passes
+        the threshold, so evictions usually find clean victims.
+        """
+        while True:
+            self._flush_event.wait()
+            self._flush_event.clear()
+            if self._closed:
                 return
 
-        raise RuntimeError("BufferPool is full and all pages are pinned; cannot evict")
+            while self._dirty_count > self._dirty_ratio_threshold * self.max_pages:
+                with self._structural_lock:
+                    batch = self._unpinned_dirty(config.EVICT_BATCH)
+                    if not batch:
+                        break
+                    self.flush_batch(batch)
+
+    def close(self):
+        """
+        Stop the background flusher, write back every dirty frame and
+        close the column files.
+        """
+        self._closed = True
+        self._flush_event.set()
+        self._flusher.join()
+        self.flush_all()
+        with self._structural_lock:
+            for fd in self._fd_cache.values():
+                os.close(fd)
+            self._fd_cache.clear()
+
+    def flush_batch(self, frames):
+        """
+        Write back a group of dirty frames (any iterable of frames).
 
-    def _flush_if_dirty(self, frame: PageFrame):
-        if not frame.dirty:
-            return
+        Frames are grouped by column file and sorted by page index; each
+        run of consecutive pages is written with a single pwritev call
+        straight from the page buffers (no to_bytes copy). The dirty flag
+        is cleared before the write, so a concurrent write re-marks the
+        frame instead of being lost.
+        """
+        by_fd = {}
+        for frame in frames:
+            with frame._lock:
+                if not frame.dirty:
+                    continue
+                frame.dirty = False
+            with self._dirty_lock:
+                self._dirty_count -= 1
+            by_fd.setdefault(frame.fd, []).append(frame)
 
-        table_name, is_base, col_id, page_index = frame.key
-        path = page_path(table_name, is_base, col_id, page_index)
-        write_page_bytes(path, frame.page.to_bytes())
-        frame.dirty = False
+        for fd, group in by_fd.items():
+            group.sort(key=lambda f: f.key)
+            start = prev = group[0].key & PAGE_INDEX_MASK
+            buffers = []
+            for frame in group:
+                page_index = frame.key & PAGE_INDEX_MASK
+                if page_index != prev + 1 or len(buffers) >= MAX_RUN_PAGES:
+                    if buffers:
+                        write_page_run(fd, start, buffers)
+                    start = page_index
+                    buffers = []
+                buffers.append(frame.page.data)
+                prev = page_index
+            write_page_run(fd, start, buffers)
 
     def flush_all(self):
         """
         Flush all frames to disk.
         """
-        with self.pool_lock:
-            for frame in list(self._frames.values()):
-                self._flush_if_dirty(frame)
+        with self._structural_lock:
+            # flush_batch never adds or removes frames, so the pool can be
+            # iterated in place instead of copied
+            self.flush_batch(f for f in self._frames.values() if f.dirty)
@@ -10,7 +10,13 @@ INT_SIZE_BYTES = 8
 
 # Buffer pool
 DEFAULT_BUFFERPOOL_PAGES = 128
-EVICTION_POLICY = "toss_immediate"  # or "lru"
+EVICTION_POLICY = "2q"  # A1in FIFO + CLOCK main queue
+A1IN_FRACTION = 0.25  # share of the pool reserved for once-touched pages
+EVICT_BATCH = 16  # max dirty frames written back per eviction
+
+# Table latches
+RECORD_LATCH_STRIPES = 64  # page_directory latches, picked by base rid (power of two)
+RID_BLOCK = 4096  # page_directory slots added at a time as rids are handed out
 
 # Merge/background
 MERGE_INTERVAL_SECONDS = 0  # disabled by default
@@ -61,8 +61,7 @@ class Database:
             if meta is None:
                 continue
 
-            table = Table.load_from_disk(meta)
-            table.bufferpool = self.bufferpool
+            table = Table.load_from_disk(meta, bufferpool=self.bufferpool)
             self.tables[table_name] = table
 
 
@@ -74,10 +73,10 @@ class Database:
         """
         for table in self.tables.values():
             table.flush_to_disk()
-        # Flush all dirty pages
+        # Flush all dirty pages and stop the background flusher
         if self.bufferpool is not None:
             try:
-                self.bufferpool.flush_all()
+                self.bufferpool.close()
             except Exception:
                 pass
         if self.path:
@@ -8,7 +8,9 @@ We annotate where shared state is READ or WRITTEN so we can later
 protect it with locks (record-level via 2PL and structure-level mutex).
 """
 
+from bisect import bisect_left, bisect_right, insort
 from collections import defaultdict
+import threading
 
 class Index:
 
@@ -22,10 +24,20 @@ class Index:
         # Read by: locate(), locate_range(), update(), delete(), insert()
         self.indices = [None] * table.num_columns
 
+        # 🔴 SHARED MUTABLE STRUCTURE
+        # Per indexed column: sorted list of the distinct values that
+        # currently have a bucket in indices[column]. Kept in step with
+        # the buckets by _add()/_remove(); used by locate_range().
+        self.sorted_values = [None] * table.num_columns
+
+        # MUTEX: one lock per column; a column's buckets and its
+        # sorted_values list only change together under it
+        self.column_locks = [threading.Lock() for _ in range(table.num_columns)]
+
     """
     Returns the location of all records with the given value
     on column "column".
-    READ-ONLY from index structure, but not thread-safe yet.
+    READ-ONLY from index structure.
     """
     def locate(self, column, value):
         # 🔵 READ: shared structure "indices"
@@ -33,14 +45,16 @@ class Index:
         if idx is None:
             return None
 
-        # 🔵 READ: idx[value] (set of RIDs)
-        # Potential race if another thread mutates set during iteration
-        return list(idx.get(value, set()))
+        # 🔵 READ: idx[value] (set of RIDs), copied under the column lock
+        # so a concurrent _add/_remove cannot change it mid-iteration
+        with self.column_locks[column]:
+            return list(idx.get(value, ()))
 
     """
     Returns the RIDs of all records with values in column "column"
     between "begin" and "end".
-    READ-ONLY but iterates over full index map.
+    READ-ONLY; binary search over the sorted distinct values, so the cost
+    is O(log n + k) instead of a scan of every bucket.
     """
     def locate_range(self, begin, end, column):
         # 🔵 READ: shared structure "indices"
@@ -48,13 +62,15 @@ class Index:
         if idx is None:
             return None
 
+        # 🔵 READ: sorted distinct values and their buckets, under the
+        # column lock so values and buckets are seen in step
         result = set()
-
-        # 🔵 READ: iterating over all index buckets
-        # RISK: another thread modifying idx during iteration
-        for val, rids in idx.items():
-            if begin <= val <= end:
-                result.update(rids)
+        with self.column_locks[column]:
+            values = self.sorted_values[column]
+            lo = bisect_left(values, begin)
+            hi = bisect_right(values, end)
+            for val in values[lo:hi]:
+                result.update(idx[val])
 
         return list(result)
 
@@ -63,20 +79,45 @@ class Index:
     This is a structural write and must be mutex-protected later.
     """
     def create_index(self, column_number):
-        if not (0 <= column_number < self.table.num_columns):
-            raise ValueError("Invalid column_number")
+        self.create_indexes([column_number])
+
+    """
+    Create indices on several columns at once.
+    Each record's tail chain is walked once for all requested columns,
+    instead of once per column.
+    """
+    def create_indexes(self, column_numbers):
+        columns = list(column_numbers)
+        for column_number in columns:
+            if not (0 <= column_number < self.table.num_columns):
+                raise ValueError("Invalid column_number")
 
-        # 🔴 LOCAL temp structure (not yet shared)
-        new_idx = defaultdict(set)
+        # 🔴 LOCAL temp structures (not yet shared)
+        new_indices = [(c, 4 + c, defaultdict(set)) for c in columns]
 
         # 🔵 READ: table.key_to_rid (shared in Table)
         # 🔵 READ: table.page_directory (shared)
+        page_directory = self.table.page_directory
         for base_rid in self.table.key_to_rid.values():
-            value = self._latest_value_for_rid_column(base_rid, column_number)
-            new_idx[value].add(base_rid)
+            base = page_directory[base_rid]
+            if base[0] == 0:
+                # never updated: base row already holds the latest values
+                for c, offset, new_idx in new_indices:
+                    new_idx[base[offset]].add(base_rid)
+                continue
+
+            latest = self._latest_values_for_rid(base_rid, columns)
+            for c, offset, new_idx in new_indices:
+                new_idx[latest[c]].add(base_rid)
 
         # 🔴 WRITE: shared structure "indices"
-        self.indices[column_number] = new_idx
+        for c, offset, new_idx in new_indices:
+            with self.column_locks[c]:
+                self.sorted_values[c] = sorted(new_idx)
+                self.indices[c] = new_idx
+
+        # 🔴 WRITE: table._indexed_columns (replaced, not mutated)
+        self.table._indexed_columns = sorted(set(self.table._indexed_columns).union(columns))
 
     """
     Drop index on specific column.
@@ -87,7 +128,10 @@ class Index:
             raise ValueError("Invalid column_number")
 
         # 🔴 WRITE: shared structure "indices"
-        self.indices[column_number] = None
+        with self.column_locks[column_number]:
+            self.indices[column_number] = None
+            self.sorted_values[column_number] = None
+        self.table._indexed_columns = [c for c in self.table._indexed_columns if c != column_number]
 
     """
     INTERNAL helper: add a RID to index bucket.
@@ -98,9 +142,36 @@ class Index:
         idx = self.indices[column]
         if idx is None:
             return
-        
+
         # 🔴 WRITE: modifies internal bucket set
-        idx.setdefault(value, set()).add(rid)
+        # MUTEX: column lock keeps bucket and sorted_values in step
+        with self.column_locks[column]:
+            bucket = idx.get(value)
+            if bucket is None:
+                bucket = idx[value] = set()
+                insort(self.sorted_values[column], value)  # 🔴 new distinct value
+            bucket.add(rid)
+
+    """
+    INTERNAL helper: add values[i] -> rids[i] for a batch of new records.
+    Called during insert_many.
+    """
+    def _add_many(self, column, values, rids):
+        # 🔵 READ: indices list
+        idx = self.indices[column]
+        if idx is None:
+            return
+
+        # 🔴 WRITE: modifies internal bucket sets
+        # MUTEX: one column lock acquisition for the whole batch
+        with self.column_locks[column]:
+            sorted_values = self.sorted_values[column]
+            for value, rid in zip(values, rids):
+                bucket = idx.get(value)
+                if bucket is None:
+                    bucket = idx[value] = set()
+                    insort(sorted_values, value)  # 🔴 new distinct value
+                bucket.add(rid)
 
     """
     INTERNAL helper: remove a RID from index bucket.
@@ -113,34 +184,83 @@ class Index:
             return
 
         # 🔵 READ/🔴 WRITE: shared bucket set
-        bucket = idx.get(value)
-        if bucket is not None:
-            bucket.discard(rid)  # 🔴 modifies set
-            if not bucket:
-                idx.pop(value, None)  # 🔴 modifies dict
+        # MUTEX: column lock keeps bucket and sorted_values in step
+        with self.column_locks[column]:
+            bucket = idx.get(value)
+            if bucket is not None:
+                bucket.discard(rid)  # 🔴 modifies set
+                if not bucket:
+                    del idx[value]  # 🔴 modifies dict
+                    values = self.sorted_values[column]
+                    values.pop(bisect_left(values, value))  # 🔴 modifies list
+
+    """
+    INTERNAL helper: move a RID from the bucket of its old value to the
+    bucket of its new value, for every indexed column of one record.
+    Columns whose entry in "new_values" is None (not written) or equal to
+    the old value are skipped. Called during update and insert's overwrite
+    path.
+    """
+    def _move_many(self, rid, old_values, new_values):
+        # 🔵 READ: indexed column list (replaced, never mutated)
+        for column in self.table._indexed_columns:
+            new = new_values[column]
+            old = old_values[column]
+            if new is None or old == new:
+                continue
+
+            # 🔵 READ: indices list
+            idx = self.indices[column]
+            if idx is None:
+                continue
+
+            # MUTEX: column lock keeps buckets and sorted_values in step
+            with self.column_locks[column]:
+                values = self.sorted_values[column]
+
+                # 🔵 READ/🔴 WRITE: old bucket
+                bucket = idx.get(old)
+                if bucket is not None:
+                    bucket.discard(rid)  # 🔴 modifies set
+                    if not bucket:
+                        del idx[old]  # 🔴 modifies dict
+                        values.pop(bisect_left(values, old))  # 🔴 modifies list
+
+                # 🔴 WRITE: new bucket
+                bucket = idx.get(new)
+                if bucket is None:
+                    bucket = idx[new] = set()
+                    insort(values, new)  # 🔴 new distinct value
+                bucket.add(rid)
 
     """
-    Walk the tail chain to resolve latest value for a column.
+    Walk the tail chain once to resolve the latest value of each column
+    in "columns". Stops as soon as every column has been resolved.
     Used during index building.
     """
-    def _latest_value_for_rid_column(self, base_rid, col_idx):
+    def _latest_values_for_rid(self, base_rid, columns):
         # 🔵 READ: shared structure table.page_directory
         base = self.table.page_directory[base_rid]
-        value = base[4 + col_idx]
+        values = {}
+        pending = set(columns)
 
         # 🔵 READ: indirection pointer
         tail_rid = base[0]
 
-        while tail_rid != 0:
+        while tail_rid != 0 and pending:
             # 🔵 READ: shared structure table.page_directory
             tail = self.table.page_directory[tail_rid]
             schema = tail[3]
 
-            # 🔵 READ: tail data
-            if len(schema) > col_idx and schema[col_idx] == '1':
-                value = tail[4 + col_idx]
-                break
+            # 🔵 READ: tail data (newest write wins)
+            for col_idx in list(pending):
+                if (schema >> col_idx) & 1:
+                    values[col_idx] = tail[4 + col_idx]
+                    pending.discard(col_idx)
 
             tail_rid = tail[0]
 
-        return value
+        for col_idx in pending:
+            values[col_idx] = base[4 + col_idx]
+
+        return values
@@ -1,10 +1,27 @@
 
 
 import struct
+import sys
 
 PAGE_SIZE = 4096          # bytes
 INT_SIZE = 8              # 64-bit signed integer
-MAX_RECORDS = PAGE_SIZE // INT_SIZE   # = 512 integers per page
+COUNT_SIZE = 2            # uint16 record count trailer at the page end
+MAX_RECORDS = (PAGE_SIZE - COUNT_SIZE) // INT_SIZE   # = 511 integers per page
+
+# pre-compiled little-endian int64 codec (no format parsing per call)
+_INT_STRUCT = struct.Struct("<q")
+
+# record count trailer, kept current on every write so the raw page
+# bytes written back by the bufferpool always carry it
+_COUNT_STRUCT = struct.Struct("<H")
+_COUNT_OFFSET = PAGE_SIZE - COUNT_SIZE
+
+# n -> struct.Struct("<{n}q"), filled lazily by write_many
+_MANY_STRUCTS = {}
+
+# pages are little-endian on disk; the native int64 view below matches
+# that layout only on little-endian hosts
+_NATIVE_LE = sys.byteorder == "little"
 
 
 class Page:
@@ -13,6 +30,9 @@ class Page:
         # raw 4096 bytes
         self.data = bytearray(PAGE_SIZE)
 
+        # int64 view over the same bytes (no copy), like an int64 array
+        self.values = memoryview(self.data).cast("q")
+
         # number of integers written into this page
         self.num_records = 0
 
@@ -37,9 +57,29 @@ class Page:
         if not self.has_capacity():
             raise Exception("Page is full")
 
-        offset = self.num_records * INT_SIZE
-        struct.pack_into("q", self.data, offset, value)
+        if _NATIVE_LE:
+            # direct element store, no format handling
+            self.values[self.num_records] = value
+        else:
+            _INT_STRUCT.pack_into(self.data, self.num_records << 3, value)
         self.num_records += 1
+        _COUNT_STRUCT.pack_into(self.data, _COUNT_OFFSET, self.num_records)
+
+    def write_many(self, values):
+        """
+        Append several 64-bit integers in order with a single pack_into
+        call. The Struct for each batch length is compiled once and cached.
+        """
+        count = len(values)
+        if self.num_records + count > MAX_RECORDS:
+            raise Exception("Page is full")
+
+        packer = _MANY_STRUCTS.get(count)
+        if packer is None:
+            packer = _MANY_STRUCTS[count] = struct.Struct(f"<{count}q")
+        packer.pack_into(self.data, self.num_records << 3, *values)
+        self.num_records += count
+        _COUNT_STRUCT.pack_into(self.data, _COUNT_OFFSET, self.num_records)
 
     # -----------------------------------------------------------
     #  READ INTEGER  (optional helper)
@@ -51,8 +91,9 @@ class Page:
         if index >= self.num_records:
             raise Exception("Index out of bounds")
 
-        offset = index * INT_SIZE
-        return struct.unpack_from("q", self.data, offset)[0]
+        if _NATIVE_LE:
+            return self.values[index]
+        return _INT_STRUCT.unpack_from(self.data, index << 3)[0]
 
     # -----------------------------------------------------------
     #  SERIALIZATION FOR DISK I/O
@@ -68,17 +109,26 @@ class Page:
     def from_bytes(cls, byte_data):
         """
         Create a Page from raw 4096-byte data.
-        IMPORTANT:
-            We cannot perfectly reconstruct num_records here,
-            because zero is a valid stored int. So Phase 1 assumes:
-                num_records = MAX_RECORDS
-            This is refined in Phase 2/3 with metadata if needed.
+        num_records is restored from the count trailer.
         """
         if len(byte_data) != PAGE_SIZE:
             raise Exception("Invalid page size for from_bytes")
 
-        page = cls()
-        page.data = bytearray(byte_data)
-        page.num_records = MAX_RECORDS  # best safe assumption for A2
+        return cls.from_buffer(bytearray(byte_data))
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """
+        Create a Page that adopts an existing 4096-byte bytearray as its
+        storage, without copying it. num_records is restored from the
+        count trailer.
+        """
+        if len(buffer) != PAGE_SIZE:
+            raise Exception("Invalid page size for from_buffer")
+
+        page = cls.__new__(cls)
+        page.data = buffer
+        page.values = memoryview(buffer).cast("q")
+        page.num_records = min(_COUNT_STRUCT.unpack_from(buffer, _COUNT_OFFSET)[0], MAX_RECORDS)
 
         return page
@@ -1,6 +1,7 @@
-from lstore.table import Table, Record
+from operator import itemgetter
+
+from lstore.table import Table, Record, clock
 from lstore.index import Index
-from time import time
 
 
 class Query:
@@ -25,44 +26,45 @@ class Query:
             - MUTEX on index structure
         """
         try:
+            table = self.table
             txn = transaction
             if txn is not None:
-                if not self.table.lock_manager.acquire_exclusive(primary_key, txn.id):
+                if not table.lock_manager.acquire_exclusive(primary_key, txn.id):
                     return False
 
             # HOT: lookup in shared dict
-            base_rid = self.table.key_to_rid.get(primary_key)
+            key_to_rid = table.key_to_rid
+            base_rid = key_to_rid.get(primary_key)
             if base_rid is None:
                 return False
 
             # RECORD LOCK should be acquired on base_rid here
 
-            # HOT: index + snapshot read
-            full = self._build_record_from_data(base_rid, [1] * self.table.num_columns)
+            # HOT: index + snapshot read (indexed columns only)
+            indexed = table._indexed_columns
+            old_values = self._latest_values(base_rid, indexed)
 
             if txn is not None:
-                txn.log_action(
-                    "delete",
-                    table=self.table,
-                    rid=base_rid,
-                    primary_key=primary_key,
-                    values=list(full.columns),
-                )
+                # old_values: dropped from latest_values below, never mutated
+                txn.log_delete(table, base_rid, primary_key, old_values)
 
             # HOT: index mutation
             # MUTEX: protect index structure
-            for c in range(self.table.num_columns):
-                if self.table.index.indices[c] is not None:
-                    self.table.index._remove(c, full.columns[c], base_rid)
+            index = table.index
+            for c in indexed:
+                index._remove(c, old_values[c], base_rid)
 
             # HOT: page_directory mutation
             # RECORD LOCK: protects this base record’s metadata
-            base_record = self.table.page_directory[base_rid]
+            base_record = table.page_directory[base_rid]
             base_record[1] = 0  # tombstone
+            table.latest_values.pop(base_rid, None)
 
             # HOT: key_to_rid mutation
             # MUTEX required
-            del self.table.key_to_rid[primary_key]
+            with table.key_to_rid_lock:
+                del key_to_rid[primary_key]
+                table._untrack_key(primary_key)
 
             return True
 
@@ -83,113 +85,163 @@ class Query:
         Required locking:
             - MUTEX on table.key_to_rid
             - MUTEX on table.page_directory
-            - MUTEX or atomic on table.next_rid
+            - atomic table.new_rid()
             - MUTEX on page allocation metadata
             - MUTEX on index structure
         """
 
         try:
-            if len(columns) != self.table.num_columns:
+            table = self.table
+            if len(columns) != table.num_columns:
                 return False
 
-            primary_key = columns[self.table.key]
+            primary_key = columns[table.key]
             txn = transaction
 
             if txn is not None:
-                if not self.table.lock_manager.acquire_exclusive(primary_key, txn.id):
+                if not table.lock_manager.acquire_exclusive(primary_key, txn.id):
                     return False
 
             # HOT: shared dict lookup
-            with self.table.key_to_rid_lock:
-                if primary_key in self.table.key_to_rid:
+            with table.key_to_rid_lock:
+                if primary_key in table.key_to_rid:
                     # overwrite existing record to make reruns idempotent
-                    existing_rid = self.table.key_to_rid[primary_key]
-                    old_full = self._build_record_from_data(existing_rid, [1] * self.table.num_columns)
+                    existing_rid = table.key_to_rid[primary_key]
+                    # only the indexed columns are needed for the index refresh
+                    old_values = self._latest_values(existing_rid, table._indexed_columns)
 
-                    schema_encoding = '0' * self.table.num_columns
+                    schema_encoding = 0  # bit i set => column i updated
                     record_data = [
                         0,
                         existing_rid,
-                        int(time()),
+                        clock.now,
                         schema_encoding,
                         *columns,
                     ]
 
-                    with self.table.page_directory_lock:
-                        self.table.page_directory[existing_rid] = record_data
-
-                    # reset positional metadata for this base record
-                    with self.table.page_metadata_lock:
-                        if getattr(self.table, "base_positions", None) is not None:
-                            self.table.base_positions[existing_rid] = None
+                    with table.record_latch(existing_rid):
+                        table.page_directory[existing_rid] = record_data
+                    table.latest_values[existing_rid] = list(columns)
+                    table.tail_chain.pop(existing_rid, None)
 
                     # refresh index entries
-                    for c in range(self.table.num_columns):
-                        if self.table.index.indices[c] is not None:
-                            self.table.index._remove(c, old_full.columns[c], existing_rid)
-                            self.table.index._add(c, columns[c], existing_rid)
+                    table.index._move_many(existing_rid, old_values, columns)
 
                     if txn is not None:
-                        txn.log_action(
-                            "update",
-                            table=self.table,
-                            rid=existing_rid,
-                            prev_tail=record_data[0],
-                            new_tail=None,
-                            old_values=list(old_full.columns),
-                            new_values=list(columns),
-                        )
+                        # old_values: replaced in latest_values, not mutated
+                        txn.log_update(table, existing_rid, record_data[0], None, old_values, columns)
                     return True
 
             # HOT: global RID assignment
-            # MUTEX or atomic increment required
-            with self.table.next_rid_lock:
-                rid = self.table.next_rid
-                self.table.next_rid += 1
+            # ATOMIC: lock-free counter
+            rid = table.new_rid()
 
-            schema_encoding = '0' * self.table.num_columns
+            schema_encoding = 0  # bit i set => column i updated
             record_data = [
                 0,
                 rid,
-                int(time()),
+                clock.now,
                 schema_encoding,
                 *columns,
             ]
 
             # HOT: page_directory mutation
             # MUTEX required
-            with self.table.page_directory_lock:
-                self.table.page_directory[rid] = record_data
+            with table.record_latch(rid):
+                table.page_directory[rid] = record_data
+            table.latest_values[rid] = list(columns)
 
             # HOT: key_to_rid mutation
             # MUTEX required
-            with self.table.key_to_rid_lock:
-                self.table.key_to_rid[primary_key] = rid
+            with table.key_to_rid_lock:
+                table.key_to_rid[primary_key] = rid
+                table._track_key(primary_key, rid)
 
             # HOT: page writes and page metadata mutation
             # MUTEX required via table._append_base_record
-            with self.table.page_metadata_lock:
-                if getattr(self.table, "_append_base_record", None):
-                    positions = self.table._append_base_record(columns)
-                    if positions is not None:
-                        # HOT: base_positions update
-                        # MUTEX required
-                        self.table.base_positions[rid] = positions
+            with table.page_metadata_lock:
+                table._append_base_record(columns)
 
             # HOT: index mutation
             # MUTEX on index
-            for c in range(self.table.num_columns):
-                if self.table.index.indices[c] is not None:
-                    self.table.index._add(c, columns[c], rid)
+            for c in table._indexed_columns:
+                table.index._add(c, columns[c], rid)
 
             if txn is not None:
-                txn.log_action(
-                    "insert",
-                    table=self.table,
-                    rid=rid,
-                    primary_key=primary_key,
-                    values=list(columns),
-                )
+                txn.log_insert(table, rid, primary_key, columns)
+
+            return True
+
+        except Exception:
+            return False
+
+    def insert_many(self, rows):
+        """
+        Insert several new base records in one pass (bulk load, no
+        transaction). Locks are taken once per batch instead of once per
+        row, columns are appended page-at-a-time, and all rows share one
+        timestamp. Rows whose key already exists (or repeats within the
+        batch) go through insert() afterwards, which overwrites.
+
+        HOT: same shared state as insert
+        """
+
+        try:
+            table = self.table
+            n = table.num_columns
+            key_col = table.key
+            rows = [tuple(row) for row in rows]
+            if any(len(row) != n for row in rows):
+                return False
+
+            key_to_rid = table.key_to_rid
+            fresh = []
+            again = []
+
+            # MUTEX: one key_to_rid_lock acquisition both partitions the
+            # batch and publishes its new keys, so a concurrent insert of
+            # the same key is seen either here or after the keys are live
+            with table.key_to_rid_lock:
+                seen = set()
+                for row in rows:
+                    primary_key = row[key_col]
+                    if primary_key in key_to_rid or primary_key in seen:
+                        again.append(row)
+                    else:
+                        seen.add(primary_key)
+                        fresh.append(row)
+
+                if fresh:
+                    # ATOMIC: lock-free counter
+                    new_rid = table.new_rid
+                    rids = [new_rid() for _ in fresh]
+                    timestamp = clock.now
+
+                    # new rids are unreachable until their keys are published
+                    # below, so their directory slots need no latches
+                    pg = table.page_directory
+                    latest_values = table.latest_values
+                    for rid, row in zip(rids, fresh):
+                        pg[rid] = [0, rid, timestamp, 0, *row]
+                        latest_values[rid] = list(row)
+
+                    track_key = table._track_key
+                    for rid, row in zip(rids, fresh):
+                        key_to_rid[row[key_col]] = rid
+                        track_key(row[key_col], rid)
+
+            if fresh:
+                # HOT: one write_many per column page
+                with table.page_metadata_lock:
+                    table._append_base_records(fresh)
+
+                # MUTEX on index
+                for c in table._indexed_columns:
+                    table.index._add_many(c, [row[c] for row in fresh], rids)
+
+            for row in again:
+                if not self.insert(*row):
+                    return False
 
             return True
 
@@ -213,45 +265,62 @@ class Query:
         """
 
         try:
+            table = self.table
             txn = transaction
-            if txn is not None and search_key_index == self.table.key:
-                if not self.table.lock_manager.acquire_shared(search_key, txn.id):
+            if txn is not None and search_key_index == table.key:
+                if not table.lock_manager.acquire_shared(search_key, txn.id):
                     return False
             # Primary key fast path
-            if search_key_index == self.table.key:
+            if search_key_index == table.key:
 
                 # HOT: shared dict lookup
-                rid = self.table.key_to_rid.get(search_key)
+                rid = table.key_to_rid.get(search_key)
                 if rid is None:
                     return []
 
+                # key-only projection: key_to_rid already holds the answer,
+                # unless an update has written the key column since
+                columns = self._projection_plan(projected_columns_index)[0]
+                if (len(columns) == 1 and columns[0] == search_key_index
+                        and not table.page_directory[rid][3] >> search_key_index & 1):
+                    projected = [None] * len(projected_columns_index)
+                    projected[search_key_index] = search_key
+                    return [Record(rid, search_key, projected)]
+
                 # RECORD LOCK should be held while building record
                 return [self._build_record_from_data(rid, projected_columns_index)]
 
             # Secondary index path
-            if self.table.index.indices[search_key_index] is not None:
+            if table.index.indices[search_key_index] is not None:
 
                 # HOT: index structure read
                 # MUTEX required
-                rids = self.table.index.locate(search_key_index, search_key) or []
+                rids = table.index.locate(search_key_index, search_key) or []
 
                 return [self._build_record_from_data(rid, projected_columns_index) for rid in rids]
 
             # Fallback: linear scan
             results = []
 
-            # HOT: iterating shared dictionary
-            # MUTEX required
-            for rid in self.table.key_to_rid.values():
+            # HOT: full scan over a published snapshot, no lock held
+            # while concurrent inserts/deletes touch key_to_rid
+            latest_values = self._latest_values
+            all_column_ids = table.all_column_ids
+            key = table.key
+            columns, _, everything = self._projection_plan(projected_columns_index)
+            width = len(projected_columns_index)
+            for rid in table.key_snapshot()[1]:
 
-                full = self._build_record_from_data(rid, [1] * self.table.num_columns)
+                user_cols = latest_values(rid, all_column_ids)
 
-                if full.columns[search_key_index] == search_key:
-                    projected = [
-                        (full.columns[i] if include == 1 else None)
-                        for i, include in enumerate(projected_columns_index)
-                    ]
-                    results.append(Record(full.rid, full.key, projected))
+                if user_cols[search_key_index] == search_key:
+                    if everything:
+                        projected = list(user_cols)
+                    else:
+                        projected = [None] * width
+                        for i in columns:
+                            projected[i] = user_cols[i]
+                    results.append(Record(rid, user_cols[key], projected))
 
             return results
 
@@ -268,75 +337,134 @@ class Query:
         """
         Reconstruct latest version of a record.
 
-        HOT: reads page_directory, base_positions, tail_positions
-        Required locking:
-            - RECORD LOCK on base_rid
-            - RECORD LOCK on each traversed tail_rid
-            - MUTEX on page_directory dict
+        Only the projected columns (plus the primary key) are resolved;
+        the rest of the record is left as None.
         """
 
-        # HOT: shared metadata read
-        with self.table.page_directory_lock:
-            base = self.table.page_directory[base_rid]
-
-        with self.table.page_metadata_lock:
-            base_positions = getattr(self.table, "base_positions", {}).get(base_rid)
-
-        # Read base version
-        if base_positions:
-            user_cols = []
-            for c in range(self.table.num_columns):
-                pos = base_positions[c]
-                if pos is not None:
-                    val = self.table._read_value_at(True, c, pos[0], pos[1])
-                    if val is None:
-                        val = base[4 + c]
-                    user_cols.append(val)
-                else:
-                    user_cols.append(base[4 + c])
-        else:
-            user_cols = list(base[4:])
+        table = self.table
+        if projected_columns_index is table.all_columns:
+            # full row: no plan lookup, no projection pass
+            user_cols = self._latest_values(base_rid, table.all_column_ids)
+            return Record(base_rid, user_cols[table.key], list(user_cols))
 
-        # Traverse tail chain
-        tail_rid = base[0]
-        tail_records = []
+        columns, needed, everything = self._projection_plan(projected_columns_index)
+        user_cols = self._latest_values(base_rid, needed)
 
-        # HOT: repeated access to page_directory
-        with self.table.page_directory_lock:
-            while tail_rid != 0:
-                tail = self.table.page_directory[tail_rid]
-                tail_records.append(tail)
-                tail_rid = tail[0]
+        # Projection
+        if everything:
+            projected = list(user_cols)
+        else:
+            projected = [None] * len(projected_columns_index)
+            for i in columns:
+                projected[i] = user_cols[i]
 
-        # Apply tail updates
-        for tail in reversed(tail_records):
-            schema = tail[3]
-            tail_rid_local = tail[1]
-            with self.table.page_metadata_lock:
-                tail_positions = getattr(self.table, "tail_positions", {}).get(tail_rid_local)
+        primary_key = user_cols[table.key]
 
-            for i in range(self.table.num_columns):
-                if schema[i] == '1':
+        return Record(base_rid, primary_key, projected)
 
-                    val = None
+    def _projection_plan(self, projected_columns_index):
+        """
+        (projected columns, columns to resolve, projects everything) for a
+        projection mask. Plans are cached per distinct mask on the table,
+        so the mask is only scanned the first time it is seen.
+        """
 
-                    if tail_positions and tail_positions[i] is not None:
-                        pos = tail_positions[i]
-                        val = self.table._read_value_at(False, i, pos[0], pos[1])
+        table = self.table
+        mask = tuple(projected_columns_index)
+        plan = table._projection_plans.get(mask)
+        if plan is None:
+            columns = [i for i, include in enumerate(mask) if include == 1]
+            needed = columns if table.key in columns else columns + [table.key]
+            plan = (columns, needed, len(columns) == len(mask) == table.num_columns)
+            table._projection_plans[mask] = plan
+        return plan
+
+    def _latest_values(self, base_rid, needed):
+        """
+        Latest values of the columns in needed, as a full-width list.
+        Columns that were not asked for may be None. The list can be the
+        shared latest_values entry, so callers must not mutate it.
 
-                    if val is None:
-                        val = tail[4 + i]
+        HOT: reads page_directory
+        Required locking:
+            - RECORD LOCK on base_rid
+            - RECORD LOCK on each traversed tail_rid
+            - MUTEX on page_directory
+        """
 
-                    user_cols[i] = val
+        table = self.table
 
-        # Projection
-        projected = []
-        for i, include in enumerate(projected_columns_index):
-            projected.append(user_cols[i] if include == 1 else None)
+        # HOT: materialized latest version, no tail walk
+        cached = table.latest_values.get(base_rid)
+        if cached is not None:
+            return cached
 
-        primary_key = user_cols[self.table.key]
+        pg = table.page_directory
+        n = table.num_columns
+        if not needed:
+            return [None] * n
 
-        return Record(base_rid, primary_key, projected)
+        # HOT: shared metadata read
+        latch = table.record_latch(base_rid)
+        with latch:
+            base = pg[base_rid]
+
+        pending = 0
+        for c in needed:
+            pending |= 1 << c
+
+        # Walk the tail chain newest first: the first tail that wrote a
+        # column holds its latest value, so stop once nothing is pending.
+        # Columns the base schema encoding shows as never updated skip
+        # the walk and come straight from the base.
+        # HOT: repeated access to page_directory
+        hits = []
+        with latch:
+            tip = tail_rid = base[0]
+            walk = pending & base[3]
+            pending ^= walk
+            while tail_rid != 0 and walk:
+                tail = pg[tail_rid]
+                schema = tail[3] & walk
+                if schema:
+                    hits.append((tail, schema))
+                    walk ^= schema
+                tail_rid = tail[0]
+            pending |= walk
+
+        if pending and len(needed) == n:
+            # full row: one C-level slice copies every base column, and
+            # the newer tail values below overwrite it
+            user_cols = base[4:]
+            pending = 0
+        else:
+            user_cols = [None] * n
+
+        # Every directory entry carries its user columns (pages only ever
+        # receive the same values), so values come straight from them.
+        # Bit loops visit set bits only: low = m & -m isolates the lowest
+        for tail, schema in hits:
+            while schema:
+                low = schema & -schema
+                schema ^= low
+                i = low.bit_length() - 1
+                user_cols[i] = tail[4 + i]
+
+        # Base version of the columns no tail has written
+        while pending:
+            low = pending & -pending
+            pending ^= low
+            c = low.bit_length() - 1
+            user_cols[c] = base[4 + c]
+
+        # Keep a full row for later reads, unless an update or an insert
+        # overwrite replaced the version we read in the meantime
+        if len(needed) == n:
+            with latch:
+                if base[0] == tip and pg[base_rid] is base:
+                    table.latest_values.setdefault(base_rid, user_cols)
+
+        return user_cols
 
     """
     =============================
@@ -350,87 +478,90 @@ class Query:
 
         HOT: heavy traversal of tail chain
         RECORD LOCK: base + tail records
-        MUTEX: page_directory and position maps
+        MUTEX: page_directory
         """
 
         try:
+            table = self.table
             txn = transaction
-            if txn is not None and search_key_index == self.table.key:
-                if not self.table.lock_manager.acquire_shared(search_key, txn.id):
+            if txn is not None and search_key_index == table.key:
+                if not table.lock_manager.acquire_shared(search_key, txn.id):
                     return False
-            if search_key_index != self.table.key:
+            if search_key_index != table.key:
                 return False
 
-            base_rid = self.table.key_to_rid.get(search_key)
+            base_rid = table.key_to_rid.get(search_key)
             if base_rid is None:
                 return []
 
-            base = self.table.page_directory[base_rid]
-            base_positions = getattr(self.table, "base_positions", {}).get(base_rid)
-
-            if base_positions:
-                user_cols = []
-                for c in range(self.table.num_columns):
-                    pos = base_positions[c]
-                    if pos is not None:
-                        val = self.table._read_value_at(True, c, pos[0], pos[1])
-                        if val is None:
-                            val = base[4 + c]
-                        user_cols.append(val)
-                    else:
-                        user_cols.append(base[4 + c])
-            else:
-                user_cols = list(base[4:])
-
-            tail_rid = base[0]
-
-            version_to_find = abs(relative_version)
-            current_version = 0
-
-            # Skip newer versions
-            while tail_rid != 0 and current_version < version_to_find:
-                tail = self.table.page_directory[tail_rid]
-                tail_rid = tail[0]
-                current_version += 1
-
-            tail_records = []
-
-            while tail_rid != 0:
-                tail = self.table.page_directory[tail_rid]
-                tail_records.append(tail)
-                tail_rid = tail[0]
-
-            # Apply tail updates
-            for tail in reversed(tail_records):
-                schema = tail[3]
-                tail_rid_local = tail[1]
-                tail_positions = getattr(self.table, "tail_positions", {}).get(tail_rid_local)
-
-                for i in range(self.table.num_columns):
-                    if schema[i] == '1':
-
-                        val = None
-
-                        if tail_positions and tail_positions[i] is not None:
-                            pos = tail_positions[i]
-                            val = self.table._read_value_at(False, i, pos[0], pos[1])
-
-                        if val is None:
-                            val = tail[4 + i]
-
-                        user_cols[i] = val
+            # only the projected columns (and the key) are replayed
+            columns, needed, everything = self._projection_plan(projected_columns_index)
+            user_cols = self._values_at_version(base_rid, needed, relative_version)
 
-            projected = []
-            for i, include in enumerate(projected_columns_index):
-                projected.append(user_cols[i] if include == 1 else None)
+            if everything:
+                projected = user_cols
+            else:
+                projected = [None] * len(projected_columns_index)
+                for i in columns:
+                    projected[i] = user_cols[i]
 
-            primary_key = user_cols[self.table.key]
+            primary_key = user_cols[table.key]
 
             return [Record(base_rid, primary_key, projected)]
 
         except Exception:
             return False
 
+    def _values_at_version(self, base_rid, needed, relative_version):
+        """
+        Values of the columns in needed as of relative_version (0 is the
+        latest, -k skips the k newest updates), as a full-width list with
+        None for the columns that were not asked for.
+
+        HOT: traversal of the tail chain
+        RECORD LOCK: base + tail records
+        """
+
+        table = self.table
+        pg = table.page_directory
+
+        user_cols = [None] * table.num_columns
+        pending = 0
+        for c in needed:
+            pending |= 1 << c
+
+        # Skip the newest versions by slicing the chain (oldest first), then
+        # walk the rest newest first until every needed column is resolved.
+        # Values come from the directory entries, same as _latest_values.
+        chain = table.tail_rids(base_rid)
+        applicable = chain[:max(len(chain) - abs(relative_version), 0)]
+        for tail_rid in reversed(applicable):
+            if not pending:
+                break
+            tail = pg[tail_rid]
+            schema = tail[3] & pending
+            if not schema:
+                continue
+            pending ^= schema
+
+            while schema:
+                low = schema & -schema
+                schema ^= low
+                i = low.bit_length() - 1
+                user_cols[i] = tail[4 + i]
+
+        # Base version of the columns no applicable tail has written
+        if pending:
+            base = pg[base_rid]
+
+            while pending:
+                low = pending & -pending
+                pending ^= low
+                c = low.bit_length() - 1
+                user_cols[c] = base[4 + c]
+
+        return user_cols
+
     """
     =============================
     UPDATE
@@ -446,85 +577,84 @@ class Query:
             - RECORD LOCK on base_rid
             - RECORD LOCK on new tail_rid
             - MUTEX on table.page_directory
-            - MUTEX or atomic on table.next_rid
+            - atomic table.new_rid()
             - MUTEX on index structures
         """
 
         try:
+            table = self.table
             txn = transaction
 
             if txn is not None:
-                if not self.table.lock_manager.acquire_exclusive(primary_key, txn.id):
+                if not table.lock_manager.acquire_exclusive(primary_key, txn.id):
                     return False
 
-            if len(columns) != self.table.num_columns:
+            if len(columns) != table.num_columns:
                 return False
 
-            with self.table.key_to_rid_lock:
-                base_rid = self.table.key_to_rid.get(primary_key)
-                if base_rid is None:
-                    return False
+            # HOT: single dict lookup, atomic under the GIL; the lock only
+            # guards compound key_to_rid + sorted_keys changes
+            base_rid = table.key_to_rid.get(primary_key)
+            if base_rid is None:
+                return False
 
             # RECORD LOCK should be acquired on base_rid here
 
-            # Old value snapshot for index updates
-            old_full = self._build_record_from_data(base_rid, [1] * self.table.num_columns)
-
-            with self.table.page_directory_lock:
-                base = self.table.page_directory[base_rid]
-                latest_tail_rid = base[0]
+            schema_encoding = 0
+            for i, c in enumerate(columns):
+                if c is not None:
+                    schema_encoding |= 1 << i
 
-            schema_bits = ['1' if c is not None else '0' for c in columns]
-            schema_encoding = "".join(schema_bits)
-
-            if '1' not in schema_encoding:
+            if schema_encoding == 0:
                 return True
 
-            # HOT: assign new tail RID
-            # MUTEX or atomic needed
-            with self.table.next_rid_lock:
-                tail_rid = self.table.next_rid
-                self.table.next_rid += 1
-
-            tail_values = [c if c is not None else 0 for c in columns]
-            tail_data = [latest_tail_rid, tail_rid, int(time()), schema_encoding, *tail_values]
-
-            # HOT: add new tail entry
-            # MUTEX required
-            with self.table.page_directory_lock:
-                self.table.page_directory[tail_rid] = tail_data
+            # Old value snapshot: only the changed indexed columns, unless
+            # the latest_values entry is missing and has to be seeded
+            seed_latest = base_rid not in table.latest_values
+            if seed_latest:
+                needed = range(table.num_columns)
+            else:
+                needed = [c for c in table._indexed_columns if (schema_encoding >> c) & 1]
+            old_values = list(self._latest_values(base_rid, needed))
 
-            # HOT: modify base indirection pointer
-            # RECORD LOCK protects this
-            with self.table.page_directory_lock:
+            # HOT: assign new tail RID
+            # ATOMIC: lock-free counter
+            tail_rid = table.new_rid()
+
+            # columns whose schema bit is clear stay None; readers never
+            # look at them, so no per-column placeholder pass is needed
+            tail_data = [0, tail_rid, clock.now, schema_encoding, *columns]
+
+            # HOT: read the current tip, add the tail entry and move the
+            # base indirection pointer in one critical section
+            # MUTEX: the base record's latch covers all three
+            with table.record_latch(base_rid):
+                base = table.page_directory[base_rid]
+                latest_tail_rid = tail_data[0] = base[0]
+                table.page_directory[tail_rid] = tail_data
                 base[0] = tail_rid
+                base[3] |= schema_encoding  # columns updated at least once
+            table._push_tail(base_rid, tail_rid)
+
+            # HOT: patch the materialized latest version in place
+            latest = table.latest_values.get(base_rid)
+            if latest is None and seed_latest:
+                latest = table.latest_values[base_rid] = old_values[:]
+            if latest is not None:
+                for i, c in enumerate(columns):
+                    if c is not None:
+                        latest[i] = c
 
             # HOT: write to tail pages
-            with self.table.page_metadata_lock:
-                if getattr(self.table, "_append_tail_updates", None):
-                    positions = self.table._append_tail_updates(columns)
-                    if positions is not None:
-                        # HOT: tail_positions mutation
-                        # MUTEX required
-                        self.table.tail_positions[tail_rid] = positions
+            with table.page_metadata_lock:
+                table._append_tail_updates(columns)
 
             # HOT: index updates
             # MUTEX on index
-            for c, new_val in enumerate(columns):
-                if new_val is not None and self.table.index.indices[c] is not None:
-                    self.table.index._remove(c, old_full.columns[c], base_rid)
-                    self.table.index._add(c, new_val, base_rid)
+            table.index._move_many(base_rid, old_values, columns)
 
             if txn is not None:
-                txn.log_action(
-                    "update",
-                    table=self.table,
-                    rid=base_rid,
-                    prev_tail=latest_tail_rid,
-                    new_tail=tail_rid,
-                    old_values=list(old_full.columns),
-                    new_values=list(columns),
-                )
+                txn.log_update(table, base_rid, latest_tail_rid, tail_rid, old_values, columns)
 
             return True
 
@@ -546,17 +676,41 @@ class Query:
         """
 
         try:
+            # HOT: binary search over the sorted primary keys
+            rids = self.table.rids_in_range(start_range, end_range)
+            if not rids:
+                return False
+
+            # only the aggregated column is resolved, no Record is built
+            table = self.table
+            cached = table.latest_values
+
+            # HOT: every row materialized -> gather and sum in C
+            rows = list(map(cached.get, rids))
+            if None not in rows:
+                return sum(map(itemgetter(aggregate_column_index), rows))
+
+            page_directory = table.page_directory
+            latest_values = self._latest_values
+            needed = [aggregate_column_index]
             total = 0
-            found_any = False
+            untouched = []
+            bit = 1 << aggregate_column_index
+            for rid in rids:
+                latest = cached.get(rid)
+                if latest is not None:
+                    total += latest[aggregate_column_index]
+                elif not page_directory[rid][3] & bit:
+                    # no tail ever wrote this column: base value is current
+                    untouched.append(rid)
+                else:
+                    total += latest_values(rid, needed)[aggregate_column_index]
 
-            # HOT: iterating shared dictionary
-            for key, rid in self.table.key_to_rid.items():
-                if start_range <= key <= end_range:
-                    found_any = True
-                    rec = self._build_record_from_data(rid, [1] * self.table.num_columns)
-                    total += rec.columns[aggregate_column_index]
+            # column never updated: one pass over the base column
+            if untouched:
+                total += table.sum_base_column(aggregate_column_index, untouched)
 
-            return total if found_any else False
+            return total
 
         except Exception:
             return False
@@ -576,27 +730,32 @@ class Query:
         """
 
         try:
-            total = 0
-            found_any = False
-
-            for key, rid in self.table.key_to_rid.items():
-                if start_range <= key <= end_range:
+            rids = self.table.rids_in_range(start_range, end_range)
+            if not rids:
+                return False
 
-                    rec_list = self.select_version(
-                        key,
-                        self.table.key,
-                        [1] * self.table.num_columns,
-                        relative_version
-                    )
+            # fused per-record version walk over the aggregated column only,
+            # no key lookup or Record per key
+            table = self.table
+            page_directory = table.page_directory
+            values_at_version = self._values_at_version
+            needed = [aggregate_column_index]
+            bit = 1 << aggregate_column_index
+            total = 0
+            untouched = []
+            for rid in rids:
+                if not page_directory[rid][3] & bit:
+                    # every version of this column is the base value
+                    untouched.append(rid)
+                    continue
+                value = values_at_version(rid, needed, relative_version)[aggregate_column_index]
+                if value is not None:
+                    total += value
 
-                    if rec_list:
-                        found_any = True
-                        record = rec_list[0]
-                        value = record.columns[aggregate_column_index]
-                        if value is not None:
-                            total += value
+            if untouched:
+                total += table.sum_base_column(aggregate_column_index, untouched)
 
-            return total if found_any else False
+            return total
 
         except Exception:
             return False
@@ -615,7 +774,7 @@ class Query:
         Locks required are inherited from those operations.
         """
 
-        rlist = self.select(key, self.table.key, [1] * self.table.num_columns, transaction=transaction)
+        rlist = self.select(key, self.table.key, self.table.all_columns, transaction=transaction)
         if rlist is False or not rlist:
             return False
         r = rlist[0]
@@ -2,10 +2,25 @@
 
 import os
 import json
+import pickle
+
+from lstore.page import PAGE_SIZE
 
 # Root directory where all table folders live.
 DATA_DIR = "data"
 
+# Version of the on-disk page layout, saved in metadata.json as
+# "page_layout". 1: one file per column, pages of MAX_RECORDS slots with
+# a record-count trailer.
+PAGE_LAYOUT_VERSION = 1
+
+# Per-record metadata fields, saved in binary next to metadata.json.
+# Each save writes a new generation (state.<n>.bin) that metadata.json
+# names, so replacing metadata.json is the single commit point.
+STATE_FIELDS = ("key_to_rid", "page_directory")
+STATE_PREFIX = "state."
+STATE_SUFFIX = ".bin"
+
 
 # ---------------------------------------------------------------
 #  Directory / Path Helpers
@@ -68,42 +83,96 @@ def load_metadata(table_name):
         return None
 
     with open(path, "r") as f:
-        return json.load(f)
+        meta = json.load(f)
+
+    # per-record fields live in the binary state file when present
+    state_file = meta.pop("state_file", None)
+    if state_file is not None:
+        with open(os.path.join(DATA_DIR, table_name, state_file), "rb") as f:
+            meta.update(pickle.load(f))
+    return meta
 
 
 def save_metadata(table_name, meta_dict):
     """
-    Save metadata.json for a table.
-    Ensures the table directory exists.
+    Save metadata for a table.
+    Ensures the table directory exists. The per-record fields go to a
+    new binary state file and the rest to metadata.json, which names it.
+    Both are written to a temporary path, synced, and renamed; the state
+    file goes first, so until metadata.json is replaced a crash leaves
+    the previous header and the state file it names intact.
     """
-    ensure_table_dir(table_name)
-    path = metadata_path(table_name)
+    table_dir = ensure_table_dir(table_name)
+
+    header = {k: v for k, v in meta_dict.items() if k not in STATE_FIELDS}
+    state = {k: meta_dict[k] for k in STATE_FIELDS if k in meta_dict}
+    old_files = _state_files(table_dir)
+    if state:
+        generation = 1 + max((g for g, _ in old_files), default=0)
+        state_file = f"{STATE_PREFIX}{generation}{STATE_SUFFIX}"
+        header["state_file"] = state_file
+        _write_atomic(
+            os.path.join(table_dir, state_file),
+            pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL),
+        )
 
-    with open(path, "w") as f:
-        json.dump(meta_dict, f, indent=4)
+    data = json.dumps(header, separators=(",", ":")).encode()
+    _write_atomic(metadata_path(table_name), data)
+
+    # older generations (and any left by a crashed save) are unreachable now
+    for _, name in old_files:
+        os.remove(os.path.join(table_dir, name))
+
+
+def _state_files(table_dir):
+    """
+    (generation, filename) of every state file in a table directory.
+    """
+    files = []
+    for name in os.listdir(table_dir):
+        if name.startswith(STATE_PREFIX) and name.endswith(STATE_SUFFIX):
+            number = name[len(STATE_PREFIX):-len(STATE_SUFFIX)]
+            if number.isdigit():
+                files.append((int(number), name))
+    return files
+
+
+def _write_atomic(path, data):
+    """
+    Write bytes to path through a synced temporary file and a rename.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
 
 # ---------------------------------------------------------------
 #  Page File Naming + Paths
 # ---------------------------------------------------------------
+#
+# All pages of one column live in a single file; page N is stored at
+# byte offset N * PAGE_SIZE.
 
-def page_filename(is_base, col_id, page_index):
+def column_filename(is_base, col_id):
     """
     Generate a filename like:
-        base_col0_pg4.bin
-        tail_col1_pg32.bin
+        base_col0.bin
+        tail_col1.bin
     """
     prefix = "base" if is_base else "tail"
-    return f"{prefix}_col{col_id}_pg{page_index}.bin"
+    return f"{prefix}_col{col_id}.bin"
 
 
-def page_path(table_name, is_base, col_id, page_index):
+def column_path(table_name, is_base, col_id):
     """
-    Returns the full on-disk path for a page.
+    Returns the full on-disk path of a column's page file.
     """
     table_dir = os.path.join(DATA_DIR, table_name)
     subdir = "base" if is_base else "tail"
-    filename = page_filename(is_base, col_id, page_index)
+    filename = column_filename(is_base, col_id)
     return os.path.join(table_dir, subdir, filename)
 
 
@@ -111,24 +180,27 @@ def page_path(table_name, is_base, col_id, page_index):
 #  Raw Page I/O
 # ---------------------------------------------------------------
 
-def write_page_bytes(path, byte_data):
+def open_column_file(path):
     """
-    Write raw page bytes to disk (overwrite).
+    Open (creating if needed) a column's page file for positional I/O.
+    Returns a raw file descriptor; the caller closes it.
     """
-    # Ensure folder exists
     os.makedirs(os.path.dirname(path), exist_ok=True)
-
-    with open(path, "wb") as f:
-        f.write(byte_data)
+    return os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
 
 
-def read_page_bytes(path):
+def write_page_run(fd, first_page_index, buffers):
     """
-    Read raw page bytes from disk.
-    Returns None if file does not exist.
+    Write consecutive pages, starting at first_page_index, with a single
+    pwritev call.
     """
-    if not os.path.exists(path):
-        return None
+    os.pwritev(fd, buffers, first_page_index * PAGE_SIZE)
+
 
-    with open(path, "rb") as f:
-        return f.read()
+def read_page_into(fd, page_index, buffer):
+    """
+    Read one page from disk directly into a caller-owned buffer.
+    Returns the number of bytes read, or None if the page was never
+    written (past the end of the file).
+    """
+    return os.preadv(fd, [buffer], page_index * PAGE_SIZE) or None
@@ -1,17 +1,69 @@
 from lstore.index import Index
+from lstore.bufferpool import MAX_COLUMNS
 from lstore.page import MAX_RECORDS
 from lstore.storage import (
     ensure_table_dir,
     save_metadata,
     load_metadata,
+    PAGE_LAYOUT_VERSION,
 )
 from lstore.lock_manager import LockManager
+from lstore.config import RECORD_LATCH_STRIPES, RID_BLOCK
+from bisect import bisect_left, bisect_right
+from itertools import count
+from operator import itemgetter
+from time import sleep, time_ns
 import threading
 
 INDIRECTION_COLUMN = 0
 RID_COLUMN = 1
 TIMESTAMP_COLUMN = 2
-SCHEMA_ENCODING_COLUMN = 3
+SCHEMA_ENCODING_COLUMN = 3  # int bitmask: bit i set => user column i updated
+
+
+class SecondClock:
+    """
+    Whole wall-clock seconds for record timestamps. A daemon thread
+    refreshes "now" right after each second boundary, so writers read an
+    attribute instead of calling into the time module per record.
+    """
+
+    NS_PER_SECOND = 1_000_000_000
+
+    def __init__(self):
+        self.now = time_ns() // self.NS_PER_SECOND
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lstore-clock", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        per_second = self.NS_PER_SECOND
+        while True:
+            ns = time_ns()
+            self.now = ns // per_second
+            # wakes once a second, just past the next boundary
+            sleep((per_second - ns % per_second) / per_second)
+
+
+# shared by every table; started by the first Table
+clock = SecondClock()
+
+
+def _int_keys(mapping):
+    """
+    A rid/key-indexed dict with int keys. JSON metadata stores them as
+    strings; the binary state file already has ints and is used as is.
+    """
+    for k in mapping:
+        if isinstance(k, int):
+            return mapping
+        break
+    return {int(k): v for k, v in mapping.items()}
 
 
 class Record:
@@ -33,14 +85,22 @@ class Table:
     """
 
     def __init__(self, name, num_columns, key_index, bufferpool=None):
+        if num_columns > MAX_COLUMNS:
+            # col_id has a fixed-width field in bufferpool page keys
+            raise ValueError(f"Tables have at most {MAX_COLUMNS} columns")
         self.name = name
         self.num_columns = num_columns
         self.key = key_index
         self.bufferpool = bufferpool
+        # small int id used to build bufferpool page keys
+        self.table_id = bufferpool.register_table(name) if bufferpool is not None else None
         self.lock_manager = LockManager()
-        self.page_directory_lock = threading.Lock()
+        clock.start()
+        # striped page_directory latches: a base record and its tails all
+        # use the latch of the base rid, so disjoint records never contend
+        self.record_latches = [threading.Lock() for _ in range(RECORD_LATCH_STRIPES)]
         self.key_to_rid_lock = threading.Lock()
-        self.next_rid_lock = threading.Lock()
+        self.directory_grow_lock = threading.Lock()
         self.page_metadata_lock = threading.Lock()
 
         # ensure table directory exists
@@ -50,21 +110,42 @@ class Table:
         # HOT SHARED METADATA STRUCTURES
         # =============================
 
-        # rid -> record metadata
+        # rid -> record metadata, as a dense list indexed by rid
+        # (rids are handed out in order; slot 0 is the "no tail" sentinel)
         # HOT: read/write in insert, update, delete, select
-        # MUTEX: protect dict structure
+        # MUTEX: directory_grow_lock extends it a block of slots at a time
         # RECORD LOCK: protect individual RID entries
-        self.page_directory = {}
+        self.page_directory = [None]
 
         # primaryKey -> rid
         # HOT: modified during insert/delete
         # MUTEX: protect dict
         self.key_to_rid = {}
 
-        # next RID to assign
-        # HOT: incremented on every insert
-        # MUTEX: must be atomic
-        self.next_rid = 1
+        # live primary keys in ascending order (same key set as key_to_rid)
+        # HOT: used by range aggregation, modified during insert/delete
+        # MUTEX: key_to_rid_lock
+        self.sorted_keys = []
+        self.sorted_rids = []  # sorted_rids[i] = key_to_rid[sorted_keys[i]]
+        # Read-only (keys, rids) tuples published for lock-free scans.
+        # Dropped by _track_key/_untrack_key, rebuilt by the next reader.
+        self._key_snapshot = None
+
+        # base_rid -> latest user column values (materialized tail chain)
+        # HOT: read by every select/sum, patched in place by update,
+        # filled by full-row reads that saw an unchanged chain tip
+        # RECORD LOCK / record latch: guard writers of an entry
+        self.latest_values = {}
+
+        # base_rid -> tail rids oldest first (the indirection chain as a list)
+        # HOT: appended by update, sliced by select_version
+        # RECORD LOCK: entries are only written under the record's lock
+        self.tail_chain = {}
+
+        # yields the next RID to assign
+        # HOT: new_rid() on every insert/update
+        # ATOMIC: itertools.count, no lock
+        self._rid_counter = count(1)
 
         # =============================
         # HOT PAGE ALLOCATION METADATA
@@ -82,11 +163,19 @@ class Table:
         self.base_page_next_slot = [0] * num_columns
         self.tail_page_next_slot = [0] * num_columns
 
-        # rid -> list of [page_index, slot] per column
-        # HOT: modified during insert/update
-        # MUTEX
-        self.base_positions = {}     # base_rid -> list of positions
-        self.tail_positions = {}     # tail_rid -> list of positions
+        # ascending columns that currently have an index; maintained by
+        # Index and replaced (never mutated) so readers can iterate it
+        # HOT: drives index maintenance in insert/update/delete
+        self._indexed_columns = []
+
+        # projection mask selecting every column; internal callers pass
+        # this exact object so _build_record_from_data takes its fast path
+        self.all_columns = (1,) * num_columns
+        self.all_column_ids = range(num_columns)
+
+        # projection mask (tuple) -> (projected cols, cols to resolve, all?)
+        # filled lazily by Query._projection_plan; only ever grows
+        self._projection_plans = {}
 
         # Index structure (has its own concurrency issues)
         self.index = Index(self)
@@ -103,19 +192,20 @@ class Table:
         PERSISTENCE: Should be called under table-level metadata lock
         to ensure snapshot consistency.
         """
+        next_rid = self._persisted_rid_limit()
         return {
             "name": self.name,
             "num_columns": self.num_columns,
             "key": self.key,
-            "next_rid": self.next_rid,
+            "next_rid": next_rid,
             "key_to_rid": self.key_to_rid,
-            "page_directory": self.page_directory,
+            "page_directory": self.page_directory[:next_rid],
             "base_page_counts": self.base_page_counts,
             "tail_page_counts": self.tail_page_counts,
             "base_page_next_slot": self.base_page_next_slot,
             "tail_page_next_slot": self.tail_page_next_slot,
-            "base_positions": self.base_positions,
-            "tail_positions": self.tail_positions,
+            "base_schema": True,
+            "page_layout": PAGE_LAYOUT_VERSION,
         }
 
     """
@@ -129,19 +219,59 @@ class Table:
 
         Assumes single-threaded execution during database startup.
         """
-        self.next_rid = meta["next_rid"]
+        self._rid_counter = count(meta["next_rid"])
 
-        # convert keys to int
+        # convert keys to int (JSON metadata stores them as strings)
         # Not thread-safe: should only run at initialization time
-        self.key_to_rid = {int(k): v for k, v in meta["key_to_rid"].items()}
-        self.page_directory = {int(k): v for k, v in meta["page_directory"].items()}
+        self.key_to_rid = _int_keys(meta["key_to_rid"])
+        self.sorted_keys = sorted(self.key_to_rid)
+        self.sorted_rids = [self.key_to_rid[k] for k in self.sorted_keys]
+        self._key_snapshot = None
+        page_directory = meta["page_directory"]
+        if isinstance(page_directory, dict):
+            # older metadata stored the directory as {rid: record}
+            dense = [None] * meta["next_rid"]
+            for k, v in page_directory.items():
+                dense[int(k)] = v
+            page_directory = dense
+        self.page_directory = page_directory
+        if not meta.get("base_schema"):
+            self._coerce_string_schemas()
+            self._rebuild_base_schema()
+
+        # Pages written in another layout (e.g. the original one file per
+        # page with 512 slots) cannot be read back. Every directory entry
+        # carries its values, so those columns start over with fresh pages.
+        if meta.get("page_layout") == PAGE_LAYOUT_VERSION:
+            self.base_page_counts = meta["base_page_counts"]
+            self.tail_page_counts = meta["tail_page_counts"]
+            self.base_page_next_slot = meta["base_page_next_slot"]
+            self.tail_page_next_slot = meta["tail_page_next_slot"]
+
+    def _coerce_string_schemas(self):
+        """
+        Turn '0'/'1' schema strings from older metadata into the int
+        bitmask (character i set => bit i set).
+        """
+        for entry in self.page_directory:
+            if entry and isinstance(entry[3], str):
+                entry[3] = int(entry[3][::-1] or "0", 2)
 
-        self.base_page_counts = meta["base_page_counts"]
-        self.tail_page_counts = meta["tail_page_counts"]
-        self.base_page_next_slot = meta.get("base_page_next_slot", [0] * self.num_columns)
-        self.tail_page_next_slot = meta.get("tail_page_next_slot", [0] * self.num_columns)
-        self.base_positions = {int(k): v for k, v in meta.get("base_positions", {}).items()}
-        self.tail_positions = {int(k): v for k, v in meta.get("tail_positions", {}).items()}
+    def _rebuild_base_schema(self):
+        """
+        Set each base record's schema encoding to the OR of its tails'
+        schemas. Metadata written before update maintained it has 0 there.
+        """
+        page_directory = self.page_directory
+        for base_rid in self.key_to_rid.values():
+            base = page_directory[base_rid]
+            schema = 0
+            tail_rid = base[0]
+            while tail_rid != 0:
+                tail = page_directory[tail_rid]
+                schema |= tail[3]
+                tail_rid = tail[0]
+            base[3] = schema
 
     """
     =============================
@@ -149,12 +279,12 @@ class Table:
     =============================
     """
     @classmethod
-    def load_from_disk(cls, meta):
+    def load_from_disk(cls, meta, bufferpool=None):
         """
         Rebuild a Table object from metadata.json.
         Called by Database.open().
         """
-        table = cls(meta["name"], meta["num_columns"], meta["key"])
+        table = cls(meta["name"], meta["num_columns"], meta["key"], bufferpool=bufferpool)
         table.from_metadata(meta)
         return table
 
@@ -175,89 +305,281 @@ class Table:
 
     """
     =============================
-    BUFFERPOOL APPEND HELPERS
+    RID ALLOCATION
     =============================
     """
 
-    def _append_to_column(self, is_base: bool, col_id: int, value: int):
+    def new_rid(self):
+        """
+        Hand out the next rid. next() on an itertools.count is a single C
+        call, so no lock is taken except when page_directory has to grow.
         """
-        Append a single 64-bit integer value to the specified column's page stream.
+        rid = next(self._rid_counter)
+        if rid >= len(self.page_directory):
+            with self.directory_grow_lock:
+                pg = self.page_directory
+                if rid >= len(pg):
+                    pg.extend([None] * (rid + RID_BLOCK - len(pg)))
+        return rid
+
+    def _persisted_rid_limit(self):
+        """
+        One past the highest rid whose page_directory slot is filled:
+        the directory length saved as "next_rid" in the metadata.
+        """
+        pg = self.page_directory
+        i = len(pg)
+        while i > 1 and pg[i - 1] is None:
+            i -= 1
+        return i
 
-        HOT: updates shared page metadata and bufferpool
-        MUTEX: protect page counters and slot counters
+    """
+    =============================
+    RECORD LATCHES
+    =============================
+    """
+
+    def record_latch(self, base_rid):
+        """
+        The page_directory latch covering base_rid and its tail records.
         """
+        return self.record_latches[base_rid & (RECORD_LATCH_STRIPES - 1)]
 
-        if self.bufferpool is None:
-            return None
-        if not (0 <= col_id < self.num_columns):
-            return None
+    """
+    =============================
+    PRIMARY KEY ORDER
+    =============================
+    """
+
+    def rids_in_range(self, start, end):
+        """
+        Base rids of the primary keys in [start, end], in key order.
+        One slice of the published snapshot, no lock once it exists.
+        """
+        keys, rids = self.key_snapshot()
+        return rids[bisect_left(keys, start):bisect_right(keys, end)]
+
+    def key_snapshot(self):
+        """
+        Immutable (sorted_keys, sorted_rids) tuples for readers.
+        Copied under key_to_rid_lock only when a write dropped the last one.
+        """
+        snap = self._key_snapshot
+        if snap is None:
+            with self.key_to_rid_lock:
+                snap = self._key_snapshot
+                if snap is None:
+                    snap = (tuple(self.sorted_keys), tuple(self.sorted_rids))
+                    self._key_snapshot = snap
+        return snap
+
+    def _track_key(self, key, rid):
+        """
+        Add a primary key and its rid to sorted_keys/sorted_rids, or
+        repoint the rid if the key is already tracked.
+        Caller holds key_to_rid_lock.
+        """
+        self._key_snapshot = None
+        keys = self.sorted_keys
+        if not keys or key > keys[-1]:
+            keys.append(key)  # common case: increasing keys
+            self.sorted_rids.append(rid)
+            return
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            self.sorted_rids[i] = rid
+        else:
+            keys.insert(i, key)
+            self.sorted_rids.insert(i, rid)
+
+    def _untrack_key(self, key):
+        """
+        Remove a primary key from sorted_keys/sorted_rids.
+        Caller holds key_to_rid_lock.
+        """
+        self._key_snapshot = None
+        keys = self.sorted_keys
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+            del self.sorted_rids[i]
+
+    """
+    =============================
+    TAIL CHAINS
+    =============================
+    """
+
+    def tail_rids(self, base_rid):
+        """
+        Tail rids of a base record, oldest first. Uses tail_chain when it
+        has the record, otherwise walks the indirection pointers.
+        """
+        chain = self.tail_chain.get(base_rid)
+        if chain is not None:
+            return chain
+
+        page_directory = self.page_directory
+        chain = []
+        with self.record_latch(base_rid):
+            tail_rid = page_directory[base_rid][0]
+            while tail_rid != 0:
+                chain.append(tail_rid)
+                tail_rid = page_directory[tail_rid][0]
+        chain.reverse()
+        return chain
+
+    def _push_tail(self, base_rid, tail_rid):
+        """
+        Record tail_rid as the newest tail of base_rid. Call after the
+        base indirection pointer has been moved to tail_rid.
+        """
+        chain = self.tail_chain.get(base_rid)
+        if chain is None:
+            self.tail_chain[base_rid] = self.tail_rids(base_rid)
+        else:
+            chain.append(tail_rid)
+
+    """
+    =============================
+    BUFFERPOOL APPEND HELPERS
+    =============================
+    """
+
+    def _append_page_index(self, is_base: bool, col_id: int):
+        """
+        Return the page the next append to this column goes to, starting a
+        new page first if the current one is full.
+
+        HOT: page creation path
+        MUTEX required: must serialize page allocation
+        """
 
         counts = self.base_page_counts if is_base else self.tail_page_counts
         slots = self.base_page_next_slot if is_base else self.tail_page_next_slot
 
         current_page_index = counts[col_id] - 1 if counts[col_id] > 0 else -1
 
-        # HOT: page creation path
-        # MUTEX required: must serialize page allocation
         if current_page_index == -1 or slots[col_id] >= MAX_RECORDS:
             current_page_index += 1
             counts[col_id] = current_page_index + 1
             slots[col_id] = 0
 
-            frame = getattr(self, "bufferpool", None).get_page(
-                self.name, is_base, col_id, current_page_index, create_if_missing=True
+            frame = self.bufferpool.get_page(
+                self.table_id, is_base, col_id, current_page_index, create_if_missing=True
             )
             if frame is not None:
                 # ensure fresh page's cursor aligned
                 frame.page.num_records = 0
-                self.bufferpool.mark_dirty(frame)
-                self.bufferpool.unpin(frame)
+                self.bufferpool.unpin(frame, dirty=True)
 
-        slot_index = slots[col_id]
+        return current_page_index
 
-        frame = self.bufferpool.get_page(
-            self.name, is_base, col_id, current_page_index, create_if_missing=True
-        )
-        if frame is None:
-            return None
+    def _append_many_to_column(self, is_base: bool, col_id: int, values):
+        """
+        Append several values to one column. Values that land on the same
+        page are written with a single Page.write_many call.
+
+        HOT: bulk insert path
+        MUTEX: protect page counters and slot counters
+        """
+
+        if self.bufferpool is None:
+            return
+        if not (0 <= col_id < self.num_columns):
+            return
+
+        slots = self.base_page_next_slot if is_base else self.tail_page_next_slot
+        i = 0
+        while i < len(values):
+            current_page_index = self._append_page_index(is_base, col_id)
+            slot_index = slots[col_id]
+            chunk = [int(v) for v in values[i:i + MAX_RECORDS - slot_index]]
+
+            frame = self.bufferpool.get_page(
+                self.table_id, is_base, col_id, current_page_index, create_if_missing=True
+            )
+            if frame is None:
+                return
+
+            frame.page.num_records = slot_index
+            frame.page.write_many(chunk)
+            slots[col_id] += len(chunk)
+            self.bufferpool.unpin(frame, dirty=True)
+            i += len(chunk)
 
-        # HOT: updating page and slot count
-        frame.page.num_records = slot_index
-        frame.page.write(int(value))
-        slots[col_id] += 1
+    def _append_base_records(self, rows):
+        """
+        Append the user columns of several new base records, one column at
+        a time so each page is filled with a single write_many call.
+
+        HOT: called during bulk insert
+        MUTEX: required indirectly via _append_many_to_column
+        """
 
-        self.bufferpool.mark_dirty(frame)
-        self.bufferpool.unpin(frame)
+        for c in range(self.num_columns):
+            self._append_many_to_column(True, c, [row[c] for row in rows])
 
-        return [current_page_index, slot_index]
+    def _append_row(self, is_base: bool, values):
+        """
+        Append one record's values to their column page streams; None
+        marks a column that is not written. The bufferpool and counter
+        lookups are done once per record instead of once per column.
+
+        HOT: called during insert and update
+        MUTEX: caller holds page_metadata_lock
+        """
+
+        bufferpool = self.bufferpool
+        if bufferpool is None:
+            return
+        get_page = bufferpool.get_page
+        unpin = bufferpool.unpin
+        table_id = self.table_id
+        counts = self.base_page_counts if is_base else self.tail_page_counts
+        slots = self.base_page_next_slot if is_base else self.tail_page_next_slot
+
+        for c, value in enumerate(values):
+            if value is None:
+                continue
+            slot_index = slots[c]
+            if counts[c] == 0 or slot_index >= MAX_RECORDS:
+                # rare: start the column's next page
+                page_index = self._append_page_index(is_base, c)
+                slot_index = 0
+            else:
+                page_index = counts[c] - 1
+
+            frame = get_page(table_id, is_base, c, page_index, True)
+            if frame is None:
+                continue
+
+            # HOT: updating page and slot count
+            page = frame.page
+            page.num_records = slot_index
+            page.write(int(value))
+            slots[c] = slot_index + 1
+            unpin(frame, True)
 
     def _append_base_record(self, user_columns):
         """
         Append all user columns of a new base record.
 
         HOT: called during insert
-        MUTEX: required indirectly via _append_to_column
+        MUTEX: required indirectly via _append_row
         """
 
-        positions = []
-        for c, val in enumerate(user_columns):
-            pos = self._append_to_column(is_base=True, col_id=c, value=val)
-            positions.append(pos)
-        return positions
+        self._append_row(True, user_columns)
 
     def _append_tail_updates(self, updated_columns):
         """
         Append updated user columns of a tail record.
 
         HOT: called during update
-        MUTEX: required indirectly via _append_to_column
+        MUTEX: required indirectly via _append_row
         """
 
-        positions = [None] * self.num_columns
-        for c, val in enumerate(updated_columns):
-            if val is not None:
-                positions[c] = self._append_to_column(is_base=False, col_id=c, value=val)
-        return positions
+        self._append_row(False, updated_columns)
 
     """
     =============================
@@ -265,25 +587,17 @@ class Table:
     =============================
     """
 
-    def _read_value_at(self, is_base: bool, col_id: int, page_index: int, slot_index: int):
+    def sum_base_column(self, col_id, base_rids):
         """
-        Read a 64-bit value from the specified page position.
+        Sum one column over base records whose schema encoding shows no
+        tail update of that column. Every directory entry carries its
+        values, so they are gathered and summed in C.
 
-        HOT: called during selects
-        Concurrency depends on bufferpool frame latching.
+        HOT: called by range aggregation
         """
 
-        if self.bufferpool is None:
-            return None
-        frame = self.bufferpool.get_page(
-            self.name, is_base, col_id, page_index, create_if_missing=False
-        )
-        if frame is None:
-            return None
-        try:
-            return frame.page.read(slot_index)
-        finally:
-            self.bufferpool.unpin(frame)
+        entries = map(self.page_directory.__getitem__, base_rids)
+        return sum(map(itemgetter(4 + col_id), entries))
 
     """
     =============================
@@ -1,22 +1,60 @@
 from lstore.table import Table, Record, INDIRECTION_COLUMN, RID_COLUMN
 from lstore.index import Index
-import threading
+from itertools import count
+import inspect
+
+# How _execute_once locks ahead of each query, resolved from the query's
+# name once in add_query
+_OP_OTHER = 0     # no lock taken here
+_OP_INSERT = 1    # exclusive on the new record's primary key
+_OP_WRITE = 2     # exclusive on args[0]
+_OP_READ = 3      # shared on args[0]
+_OP_TAGS = {
+    "insert": _OP_INSERT,
+    "update": _OP_WRITE,
+    "delete": _OP_WRITE,
+    "select": _OP_READ,
+    "select_version": _OP_READ,
+}
+
+# undo_log entries are flat tuples led by an action code:
+#   (UNDO_INSERT, table, rid, primary_key, values)
+#   (UNDO_DELETE, table, rid, primary_key, values)
+#   (UNDO_UPDATE, table, rid, prev_tail, new_tail, old_values, new_values)
+UNDO_INSERT = 1
+UNDO_UPDATE = 2
+UNDO_DELETE = 3
+
+# function -> whether it takes a transaction= keyword; filled by
+# _accepts_transaction so each query method is inspected once
+_ACCEPTS_TRANSACTION = {}
+
+
+def _accepts_transaction(query):
+    func = getattr(query, "__func__", query)  # bound method -> function
+    accepts = _ACCEPTS_TRANSACTION.get(func)
+    if accepts is None:
+        try:
+            accepts = "transaction" in inspect.signature(func).parameters
+        except (TypeError, ValueError):
+            accepts = False  # no introspectable signature
+        _ACCEPTS_TRANSACTION[func] = accepts
+    return accepts
 
 
 class Transaction:
-    transaction_counter = 0
-    counter_lock = threading.Lock()
+    # next() on a count is one C call, atomic under the GIL: no lock
+    _next_id = count().__next__
 
     """
     Creates a transaction object.
     """
     def __init__(self):
         self.queries = []
-        with Transaction.counter_lock:
-            self.id = Transaction.transaction_counter
-            Transaction.transaction_counter += 1
+        self.id = Transaction._next_id()
+        self._lock_managers = []  # one per table touched, filled by add_query
 
-        self.undo_log = []      # list of (action, payload)
+        self.undo_log = []      # list of undo tuples, see UNDO_*
         self._running = False
 
     """
@@ -27,7 +65,11 @@ class Transaction:
     t.add_query(q.update, grades_table, 0, *[None, 1, None, 2, None])
     """
     def add_query(self, query, table, *args):
-        self.queries.append((query, args, table))
+        op = _OP_TAGS.get(getattr(query, "__name__", ""), _OP_OTHER)
+        self.queries.append((query, args, table, op, _accepts_transaction(query)))
+        lm = table.lock_manager
+        if lm not in self._lock_managers:  # a handful of tables at most
+            self._lock_managers.append(lm)
 
     
     def run(self):
@@ -51,27 +93,22 @@ class Transaction:
             self._running = False
 
     def _execute_once(self):
-        for query, args, table in self.queries:
-            # determine target rid/primary key for locking
-            primary_key = None
-            name = getattr(query, "__name__", "")
-            if name == "insert":
-                primary_key = args[table.key]
-                if not table.lock_manager.acquire_exclusive(primary_key, self.id):
+        for query, args, table, op, accepts_transaction in self.queries:
+            # lock the target primary key; integer tag, no name compares
+            if op == _OP_INSERT:
+                if not table.lock_manager.acquire_exclusive(args[table.key], self.id):
                     return False, True
-            elif name in ("update", "delete"):
-                primary_key = args[0]
-                if not table.lock_manager.acquire_exclusive(primary_key, self.id):
+            elif op == _OP_WRITE:
+                if not table.lock_manager.acquire_exclusive(args[0], self.id):
                     return False, True
-            elif name in ("select", "select_version"):
-                primary_key = args[0]
-                if not table.lock_manager.acquire_shared(primary_key, self.id):
+            elif op == _OP_READ:
+                if not table.lock_manager.acquire_shared(args[0], self.id):
                     return False, True
 
             # execute query; pass transaction if supported
-            try:
+            if accepts_transaction:
                 result = query(*args, transaction=self)
-            except TypeError:
+            else:
                 result = query(*args)
 
             if result is False:
@@ -79,19 +116,29 @@ class Transaction:
         return True, False
 
     
-    def log_action(self, action, **payload):
+    def log_insert(self, table, rid, primary_key, values):
         """
-        Record an undo action. action is a string: insert/update/delete.
-        Payload fields are action-specific.
+        Record the undo entry of an insert. Value sequences here and in
+        log_delete/log_update are kept by reference; callers pass tuples
+        or lists nobody mutates later.
         """
-        self.undo_log.append((action, payload))
+        self.undo_log.append((UNDO_INSERT, table, rid, primary_key, values))
+
+    def log_delete(self, table, rid, primary_key, values):
+        self.undo_log.append((UNDO_DELETE, table, rid, primary_key, values))
+
+    def log_update(self, table, rid, prev_tail, new_tail, old_values, new_values):
+        self.undo_log.append(
+            (UNDO_UPDATE, table, rid, prev_tail, new_tail, old_values, new_values)
+        )
 
     
     def abort(self):
-        # Roll back in reverse order
-        for action, payload in reversed(self.undo_log):
-            self._apply_undo(action, payload)
-        self.undo_log.clear()
+        # Roll back in reverse order; popping frees each entry as it is
+        # undone instead of holding the whole log until the end
+        undo_log = self.undo_log
+        while undo_log:
+            self._apply_undo(undo_log.pop())
         # Release all locks held by this transaction
         self._release_all_locks()
         return False
@@ -104,91 +151,101 @@ class Transaction:
     
     def _release_all_locks(self):
         # Every table uses its own lock_manager; call release_all on each unique one.
-        seen = set()
-        for _, _, table in self.queries:
-            lm = table.lock_manager
-            if lm in seen:
-                continue
+        for lm in self._lock_managers:
             lm.release_all(self.id)
-            seen.add(lm)
 
-    def _apply_undo(self, action, payload):
+    def _apply_undo(self, entry):
         """
         Undo handler. Query operations are responsible for logging the
-        necessary metadata in payload so rollback can restore state.
+        necessary metadata in the entry so rollback can restore state.
+        Dispatches on the entry's action code through _UNDO_HANDLERS.
         """
-        table = payload.get("table")
-        if table is None:
-            return
+        if entry[1] is not None:
+            _UNDO_HANDLERS[entry[0]](self, entry)
+
+    def _undo_insert(self, entry):
+        _, table, rid, primary_key, user_values = entry
+        if primary_key is not None:
+            with table.key_to_rid_lock:
+                if table.key_to_rid.pop(primary_key, None) is not None:
+                    table._untrack_key(primary_key)
 
-        if action == "insert":
-            rid = payload.get("rid")
-            primary_key = payload.get("primary_key")
-            if primary_key is not None:
-                with table.key_to_rid_lock:
-                    table.key_to_rid.pop(primary_key, None)
-
-            if rid is not None:
-                with table.page_directory_lock:
-                    record = table.page_directory.get(rid)
-                    if record:
-                        # mark tombstone
-                        record[RID_COLUMN] = 0
-
-            # remove from index
-            user_values = payload.get("values")
-            if user_values:
-                for c, val in enumerate(user_values):
-                    if table.index.indices[c] is not None:
-                        table.index._remove(c, val, rid)
-
-        elif action == "delete":
-            rid = payload.get("rid")
-            primary_key = payload.get("primary_key")
-            old_values = payload.get("values") or []
-
-            if rid is None or primary_key is None:
-                return
-
-            with table.page_directory_lock:
-                record = table.page_directory.get(rid)
+        if rid is not None:
+            with table.record_latch(rid):
+                record = table.page_directory[rid]
                 if record:
-                    record[RID_COLUMN] = rid
+                    # mark tombstone
+                    record[RID_COLUMN] = 0
+            table.latest_values.pop(rid, None)
 
-            with table.key_to_rid_lock:
-                table.key_to_rid[primary_key] = rid
-
-            for c, val in enumerate(old_values):
-                if table.index.indices[c] is not None and val is not None:
-                    table.index._add(c, val, rid)
-
-        elif action == "update":
-            rid = payload.get("rid")
-            prior_tail = payload.get("prev_tail")
-            new_tail = payload.get("new_tail")
-            old_values = payload.get("old_values") or []
-            new_values = payload.get("new_values") or []
-
-            if rid is None:
-                return
-
-            # restore base indirection
-            with table.page_directory_lock:
-                base = table.page_directory.get(rid)
-                if base:
-                    base[INDIRECTION_COLUMN] = prior_tail if prior_tail is not None else 0
-
-                # tombstone newly appended tail record if any
-                if new_tail is not None and new_tail in table.page_directory:
-                    table.page_directory[new_tail][RID_COLUMN] = 0
-
-            # revert index changes
-            for c in range(len(old_values)):
-                old_val = old_values[c]
-                new_val = new_values[c] if c < len(new_values) else None
-                if table.index.indices[c] is None:
-                    continue
-                if new_val is not None:
-                    table.index._remove(c, new_val, rid)
-                if old_val is not None:
-                    table.index._add(c, old_val, rid)
+        # remove from index
+        if user_values:
+            for c in table._indexed_columns:
+                if c < len(user_values):
+                    table.index._remove(c, user_values[c], rid)
+
+    def _undo_delete(self, entry):
+        _, table, rid, primary_key, old_values = entry
+        old_values = old_values or []
+
+        if rid is None or primary_key is None:
+            return
+
+        with table.record_latch(rid):
+            record = table.page_directory[rid]
+            if record:
+                record[RID_COLUMN] = rid
+
+        with table.key_to_rid_lock:
+            table._track_key(primary_key, rid)
+            table.key_to_rid[primary_key] = rid
+
+        for c in table._indexed_columns:
+            val = old_values[c] if c < len(old_values) else None
+            if val is not None:
+                table.index._add(c, val, rid)
+
+    def _undo_update(self, entry):
+        _, table, rid, prior_tail, new_tail, old_values, new_values = entry
+        old_values = old_values or []
+        new_values = new_values or []
+
+        if rid is None:
+            return
+
+        # restore base indirection
+        with table.record_latch(rid):
+            base = table.page_directory[rid]
+            if base:
+                base[INDIRECTION_COLUMN] = prior_tail if prior_tail is not None else 0
+
+            # tombstone newly appended tail record if any
+            if new_tail is not None and table.page_directory[new_tail] is not None:
+                table.page_directory[new_tail][RID_COLUMN] = 0
+
+        # drop the materialized version; the next read rebuilds it
+        table.latest_values.pop(rid, None)
+        chain = table.tail_chain.get(rid)
+        if chain and chain[-1] == new_tail:
+            chain.pop()
+        else:
+            table.tail_chain.pop(rid, None)
+
+        # revert index changes
+        for c in table._indexed_columns:
+            if c >= len(old_values):
+                continue
+            old_val = old_values[c]
+            new_val = new_values[c] if c < len(new_values) else None
+            if new_val is not None:
+                table.index._remove(c, new_val, rid)
+            if old_val is not None:
+                table.index._add(c, old_val, rid)
+
+
+# action code -> Transaction handler, for _apply_undo
+_UNDO_HANDLERS = {
+    UNDO_INSERT: Transaction._undo_insert,
+    UNDO_UPDATE: Transaction._undo_update,
+    UNDO_DELETE: Transaction._undo_delete,
+}
@@ -43,5 +43,6 @@ class TransactionWorker:
         for transaction in self.transactions:
             # each transaction returns True if committed or False if aborted
             self.stats.append(transaction.run())
-        self.result = len(list(filter(lambda x: x, self.stats)))
+        # one C-level scan, no per-element callback or temporary list
+        self.result = self.stats.count(True)
         self._running = False
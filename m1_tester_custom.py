@@ -1,6 +1,7 @@
 
 #!/usr/bin/env python3
 import random
+import shutil
 import time
 
 from lstore.db import Database
@@ -24,6 +25,61 @@ def select_exact(query, key):
     return query.select(key, query.table.key, [1] * query.table.num_columns)[0]
 
 
+def bulk_load_checks():
+    """
+    insert_many on a bufferpool-backed table: a batch that spans several
+    pages, keys repeated within the batch and against existing rows, an
+    index on a non-key column, and a reopen.
+    """
+    path = "./CS451_bulk"
+    shutil.rmtree(path, ignore_errors=True)
+
+    db = Database()
+    db.open(path)
+    table = db.create_table("Bulk", 5, 0)
+    query = Query(table)
+    table.index.create_index(2)
+
+    assert query.insert(1, 0, 0, 0, 0) is True
+    rows = {}
+    batch = []
+    for i in range(1200):  # more than two pages per column
+        k = i - 1 if i % 100 == 0 and i else i  # some keys repeat in the batch
+        row = [k, i % 7, i % 11, i, 2 * i]
+        batch.append(row)
+        rows[k] = row  # later rows overwrite earlier ones
+    batch.append([1, 5, 5, 5, 5])  # key inserted before the batch
+    rows[1] = [1, 5, 5, 5, 5]
+    t0 = time.time()
+    assert query.insert_many(batch) is True
+    print(f"Bulk-loaded {len(batch)} rows in {time.time() - t0:.4f}s")
+
+    def check(query):
+        for k, row in rows.items():
+            rec = select_exact(query, k)
+            assert rec.columns == row, f"bulk row mismatch: key={k} got={rec.columns} want={row}"
+        for v in range(11):
+            got = sorted(r.key for r in query.select(v, 2, [1, 0, 0, 0, 0]))
+            want = sorted(k for k, row in rows.items() if row[2] == v)
+            assert got == want, f"index mismatch on value {v}"
+        for col in range(5):
+            want = sum(row[col] for row in rows.values())
+            got = query.sum(0, 1200, col)
+            assert got == want, f"bulk sum mismatch: col={col} got={got} want={want}"
+
+    check(query)
+    db.close()
+
+    db = Database()
+    db.open(path)
+    query = Query(db.get_table("Bulk"))
+    query.table.index.create_index(2)
+    check(query)
+    db.close()
+    shutil.rmtree(path, ignore_errors=True)
+    print("  Bulk load checks OK.")
+
+
 def main():
     random.seed(3562901)
 
@@ -132,6 +188,11 @@ def main():
         print(f"  tail_rid={tail[1]} tail_ts={tail[2]} tail_schema={tail[3]}")
     print()
 
+    # 6) Bulk load
+    print("Running bulk load checks...")
+    bulk_load_checks()
+    print()
+
     print("All sanity checks passed.")
 
 